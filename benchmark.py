@@ -0,0 +1,242 @@
+"""Benchmark do caminho quente do app contra a planilha falsa (fake_sheets).
+
+Mede parse, inclusão (parser -> estado -> fila), sincronização, exclusão e
+PDF com 100, 1k, 10k e 100k linhas na planilha, e mostra vazão e p50/p99.
+
+    python benchmark.py
+    python benchmark.py --sizes 100,1000 --latency 0.15 --jsonl bench.jsonl
+
+Com --jsonl cada resultado vira uma linha no arquivo, para comparar versões.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from buffet_core import (HEADERS, PDF_COLUMNS, EventStore, GuestParser, LocalJournal, SheetIndex, WriteQueue,
+                         build_report_pdf, parse_input_text, to_sheet_row)
+from fake_sheets import FakeBackend, FakeClient
+
+EVENT = "Festa Benchmark"
+DAY = "17/10/2026"
+NAMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabi", "Heitor", "Iara", "João", "Lara", "Miguel"]
+SAMPLE_INPUTS = ["Carlos", "Helena 6", "Maria Mãe", "joão 10 anos", "Tia Rosa", "Pedro 3a", "Ana Clara 12",
+                 "Vovó Lúcia", "Bebê 1", "Ricardo Souza"]
+
+# ==========================================
+# MEDIÇÃO
+# ==========================================
+
+def percentile(sorted_values, q):
+    """Ordem mais próxima (nearest-rank), em cima de uma lista já ordenada"""
+    if not sorted_values: return None
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+def measure(fn, repeat, budget, min_runs=3, warmup=1):
+    """Roda `fn` até `repeat` vezes (para antes se passar de `budget` s, depois de `min_runs`).
+
+    As primeiras `warmup` rodadas não contam (imports e caches frios).
+    """
+    for _ in range(warmup): fn()
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat:
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+        if len(times) >= min_runs and time.perf_counter() - started > budget: break
+    return sorted(times)
+
+def wait_drained(queue, timeout=120):
+    deadline = time.monotonic() + timeout
+    while queue.pending and time.monotonic() < deadline: time.sleep(0.0005)
+    if queue.pending: raise RuntimeError(f"fila não esvaziou ({queue.pending} pendentes, último erro: {queue.last_error})")
+
+# ==========================================
+# CENÁRIO
+# ==========================================
+
+def make_guest(parser, text, gid, hora="19:00"):
+    g = dict(parser.parse(text))
+    g.update({"id": gid, "Hora": hora, "Data": DAY, "Evento": EVENT})
+    return g
+
+def sheet_rows(parser, n, rng):
+    """Cabeçalho + marcador do evento + n convidados, como o app grava"""
+    rows = [HEADERS, ["SYSTEM", "--- START ---", "System", str(n), "SYSTEM_START", "18:00", DAY, EVENT]]
+    for i in range(n):
+        text = f"{rng.choice(NAMES)} {i}" + (f" {rng.randint(1, 12)}" if rng.random() < 0.3 else "")
+        g = make_guest(parser, text, f"2026101718{i:014d}", f"{18 + i * 6 // max(n, 1):02d}:{rng.randint(0, 59):02d}")
+        rows.append(to_sheet_row(g))
+    return rows
+
+class Scenario:
+    """Planilha falsa com n linhas, diário temporário, índice, fila e estado do evento"""
+
+    def __init__(self, n, backend_opts, seed=7):
+        self.n = n
+        self.rng = random.Random(seed)
+        self.parser = GuestParser()
+        self.backend = FakeBackend(seed=seed)
+        self.client = FakeClient(self.backend)
+        self.sheet = self.client.open("Controle_Buffet").sheet1
+        self.sheet.rows = sheet_rows(self.parser, n, self.rng)
+        self.tmp = tempfile.mkdtemp(prefix="buffet-bench-")
+        self.journal = LocalJournal(os.path.join(self.tmp, "journal.db"))
+        self.index = SheetIndex()
+        self.queue = WriteQueue(lambda part: self.sheet, journal=self.journal, get_index=lambda part: self.index,
+                                flush_ms=0, offline_wait=0.01)
+        self.store = EventStore(EVENT.lower(), DAY)
+        self._seq = 0
+        self.sync_errors = 0
+        self.sync()
+        self.store.load(self.guests_from_journal(), n)
+        # Latência, cota e falhas só valem depois de montado o cenário
+        for k, v in backend_opts.items(): setattr(self.backend, k, v)
+
+    def close(self):
+        self.journal.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def next_id(self):
+        self._seq += 1
+        return f"2026101720{self._seq:014d}"
+
+    def guests_from_journal(self):
+        """O que load_data_from_sheets monta: sem o marcador, do mais novo para o mais antigo"""
+        out = []
+        for row in self.journal.rows(DAY, EVENT):
+            if row.get('Status') == "SYSTEM_START": continue
+            row['_is_paying'] = row.get('Status') == "Pagante"
+            out.append(row)
+        return out[::-1]
+
+    def sync(self):
+        """O mesmo caminho de load_data_from_sheets: refresh do índice + merge no diário + leitura"""
+        seen_at = time.time()
+        try:
+            self.index.refresh(self.sheet)
+            self.journal.merge(DAY, EVENT, self.index.records(DAY, EVENT), seen_at)
+        except Exception: self.sync_errors += 1 # O app também segue com o diário local
+        return self.journal.rows(DAY, EVENT)
+
+    def summary(self):
+        return {"rows": self.n, "calls": sum(self.backend.calls.values()), "errors": dict(self.backend.errors),
+                "sync_errors": self.sync_errors, "queue_failed": self.queue.failed}
+
+# ==========================================
+# CASOS
+# ==========================================
+
+def bench_parse(args):
+    texts = SAMPLE_INPUTS * 10
+    def run():
+        for t in texts: parse_input_text(t)
+    times = measure(run, args.repeat * 10, args.budget)
+    return [("parse", "-", [t / len(texts) for t in times], len(texts) * len(times) / sum(times))]
+
+def bench_size(n, args, summaries):
+    sc = Scenario(n, args.backend)
+    results = []
+    try:
+        # Inclusão: o que o tablet espera (parser -> duplicados -> estado -> diário/fila)
+        def add():
+            parsed = sc.parser.parse_batch(f"{sc.rng.choice(NAMES)} {sc.rng.randint(1, 12)}, {sc.rng.choice(NAMES)} Silva")
+            guests = [dict(p, id=sc.next_id(), Hora="21:00", Data=DAY, Evento=EVENT) for p in parsed if not sc.store.duplicate_of(p)]
+            sc.store.add_many(guests)
+            sc.queue.put_many(guests)
+        times = measure(add, args.repeat, args.budget)
+        results.append(("add", n, times, len(times) / sum(times)))
+        # Até a planilha confirmar (fila em segundo plano, inclui a latência simulada)
+        def add_synced():
+            add()
+            wait_drained(sc.queue)
+        wait_drained(sc.queue)
+        times = measure(add_synced, args.repeat, args.budget)
+        results.append(("add.sheet", n, times, len(times) / sum(times)))
+
+        # Sincronização a frio (índice vazio, lê a planilha inteira) e a quente (só a cauda nova)
+        def cold():
+            sc.index = SheetIndex()
+            sc.sync()
+        times = measure(cold, args.repeat, args.budget)
+        results.append(("sync.cold", n, times, len(times) / sum(times)))
+        def warm():
+            # Outra portaria gravou 2 linhas desde o último refresh
+            sc.sheet.rows.extend(to_sheet_row(make_guest(sc.parser, f"{sc.rng.choice(NAMES)} Outro", sc.next_id())) for _ in range(2))
+            sc.sync()
+        times = measure(warm, args.repeat, args.budget)
+        results.append(("sync.warm", n, times, len(times) / sum(times)))
+
+        # Exclusão ponta a ponta: some do estado e da planilha (um batch por exclusão)
+        victims = iter(sc.store.guests()[::-1])
+        def delete():
+            g = next(victims)
+            sc.store.remove(g['id'])
+            sc.queue.put_delete(g)
+            wait_drained(sc.queue)
+        times = measure(delete, min(args.repeat, n), args.budget)
+        results.append(("delete", n, times, len(times) / sum(times)))
+
+        # PDF: o que generate_pdf faz, sem o cache do Streamlit
+        def pdf():
+            columns = sc.store.columns([name for name, _, _ in PDF_COLUMNS])
+            build_report_pdf(EVENT, columns, sc.store.counts(), sc.store.limit, "17/10/2026 22:00")
+        times = measure(pdf, args.repeat, args.budget)
+        results.append(("pdf", n, times, len(times) / sum(times)))
+        summaries.append(sc.summary())
+    finally:
+        sc.close()
+    return results
+
+# ==========================================
+# RELATÓRIO
+# ==========================================
+
+def git_revision():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError): return None
+
+def report(results, summaries, args):
+    print(f"{'caso':<10} {'linhas':>7} {'n':>5} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    rev, stamp = git_revision(), datetime.now().isoformat(timespec='seconds')
+    lines = []
+    for case, rows, times, rate in results:
+        p50, p99 = 1000 * percentile(times, 0.50), 1000 * percentile(times, 0.99)
+        print(f"{case:<10} {rows!s:>7} {len(times):>5} {rate:>10,.1f} {p50:>10.3f} {p99:>10.3f}")
+        lines.append({"ts": stamp, "rev": rev, "case": case, "rows": rows, "n": len(times),
+                      "ops_per_s": rate, "p50_ms": round(p50, 4), "p99_ms": round(p99, 4), "backend": args.backend})
+    for s in summaries:
+        print(f"{s['rows']} linhas: {s['calls']} chamadas à planilha, erros {s['errors'] or '-'}, "
+              f"sync sem rede {s['sync_errors']}, fila com falha {s['queue_failed']}")
+        lines.append({"ts": stamp, "rev": rev, "case": "summary", **s, "backend": args.backend})
+    if args.jsonl:
+        with open(args.jsonl, "a", encoding="utf-8") as f:
+            for line in lines: f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="100,1000,10000,100000", help="linhas na planilha, separadas por vírgula")
+    ap.add_argument("--repeat", type=int, default=50, help="repetições por caso")
+    ap.add_argument("--budget", type=float, default=5.0, help="segundos por caso (mínimo de 3 repetições)")
+    ap.add_argument("--latency", type=float, default=0.0, help="latência simulada por chamada à planilha (s)")
+    ap.add_argument("--jitter", type=float, default=0.0, help="variação extra de latência (s)")
+    ap.add_argument("--quota", type=int, default=None, help="chamadas por minuto antes do 429")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="chance de cada chamada falhar com 503")
+    ap.add_argument("--jsonl", help="acrescenta os resultados neste arquivo")
+    args = ap.parse_args(argv)
+    args.backend = {"latency": args.latency, "jitter": args.jitter, "quota_per_minute": args.quota, "fail_rate": args.fail_rate}
+
+    results, summaries = bench_parse(args), []
+    for n in (int(s) for s in args.sizes.split(",") if s.strip()):
+        results += bench_size(n, args, summaries)
+    report(results, summaries, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1396 @@
+import bisect
+import collections
+import contextlib
+import hashlib
+import heapq
+import itertools
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta, timezone
+
+try:
+    from gspread.exceptions import WorksheetNotFound
+except ImportError:
+    class WorksheetNotFound(Exception): pass
+
+# ==========================================
+# NÚCLEO SEM INTERFACE (usado pelo app Streamlit)
+# ==========================================
+
+HEADERS = ["id", "Nome", "Tipo", "Idade", "Status", "Hora", "Data", "Evento"]
+LAST_COL = "H"
+
+def to_sheet_row(row_data):
+    """Converte o dict do convidado na linha da planilha (ordem de HEADERS)"""
+    return [
+        str(row_data.get('id')), row_data.get('Nome'), row_data.get('Tipo'),
+        str(row_data.get('Idade')), row_data.get('Status'), row_data.get('Hora'),
+        row_data.get('Data'), row_data.get('Evento')
+    ]
+
+def _norm_row(values, width):
+    """Normaliza uma linha da API (células vazias no fim são omitidas pelo Google)"""
+    row = ['' if v is None else str(v) for v in list(values)[:width]]
+    return row + [''] * (width - len(row))
+
+# ==========================================
+# 1. LEITURA INCREMENTAL DA PLANILHA
+# ==========================================
+
+class SheetIndex:
+    """Espelho local da planilha: busca só as linhas novas e indexa por Data/Evento e por id.
+
+    A cada refresh pede numa única chamada a última linha conhecida (âncora) e o
+    intervalo depois dela. Se a âncora mudou, alguém apagou ou reordenou linhas
+    e fazemos uma releitura completa.
+
+    As posições internas nunca mudam: uma linha apagada vira None e entra em
+    `_deleted`, e o número real na planilha é a posição menos as exclusões
+    anteriores a ela (busca binária). Assim achar e apagar pelo id não exige
+    varrer a planilha nem reescrever o índice.
+
+    Linha sem id (digitada direto na planilha) recebe um id substituto estável:
+    hash do conteúdo + quantas iguais vieram antes ('~3f2a9c01b7de.2').
+    """
+
+    def __init__(self, width=len(HEADERS)):
+        self.width = width
+        self.lock = threading.RLock()
+        self.full_scans = 0
+        self.seen_at = None  # time.time() do início do último refresh que deu certo
+        self._reset()
+
+    def _reset(self):
+        self.header = []
+        self._rows = []      # posição p -> linha (ou None se apagada)
+        self._deleted = []   # posições apagadas, em ordem
+        self._by_key = {}    # (data, evento minúsculo) -> [posições]
+        self._by_day = {}    # data -> {evento minúsculo: nome exibido}
+        self._by_id = {}     # id -> [posições] (uma retentativa antiga pode ter gravado a linha duas vezes)
+        self._surrogates = {}   # posição -> id substituto das linhas sem id
+        self._copies = collections.Counter()   # conteúdo sem id -> quantas linhas iguais já vieram
+        self._id_col = 0
+
+    @property
+    def last_row(self):
+        return (1 if self.header else 0) + len(self._rows) - len(self._deleted)
+
+    def _sheet_row(self, pos):
+        return pos + 2 - bisect.bisect_left(self._deleted, pos)
+
+    def _last_live(self):
+        for row in reversed(self._rows):
+            if row is not None: return row
+        return self.header
+
+    def refresh(self, sheet):
+        """Atualiza o espelho. Retorna quantas linhas novas chegaram."""
+        with self.lock:
+            started = time.time()
+            if not self.header: return self._full_scan(sheet, started)
+            n = self.last_row
+            with METRICS.timed('sheets.batch_get'):
+                anchor, tail = sheet.batch_get([f"A{n}:{LAST_COL}{n}", f"A{n + 1}:{LAST_COL}"])
+            if not anchor or _norm_row(anchor[0], self.width) != self._last_live():
+                return self._full_scan(sheet, started)
+            for values in tail: self._append(values)
+            self.seen_at = started
+            return len(tail)
+
+    def _full_scan(self, sheet, started):
+        # Lê antes de limpar: se a leitura falhar, o espelho antigo continua valendo
+        with METRICS.timed('sheets.get_all_values'): values = sheet.get_all_values()
+        self.full_scans += 1
+        self._reset()
+        self.seen_at = started
+        if not values: return 0
+        self.header = _norm_row(values[0], self.width)
+        self._id_col = next((i for i, h in enumerate(self.header) if h.lower() == 'id'), 0)
+        for v in values[1:]: self._append(v)
+        return len(self._rows)
+
+    def _append(self, values):
+        row = _norm_row(values, self.width)
+        pos = len(self._rows)
+        self._rows.append(row)
+        gid = row[self._id_col] or self._surrogate(pos, row)
+        self._by_id.setdefault(gid, []).append(pos)
+        rec = self._record(row)
+        day, evt = str(rec.get('Data', '')).strip(), str(rec.get('Evento', '')).strip()
+        if not evt: return
+        self._by_key.setdefault((day, evt.lower()), []).append(pos)
+        self._by_day.setdefault(day, {}).setdefault(evt.lower(), evt)
+
+    def _surrogate(self, pos, row):
+        content = "\x1f".join(v for i, v in enumerate(row) if i != self._id_col)
+        digest = hashlib.sha1(content.encode()).hexdigest()[:12]
+        self._copies[digest] += 1
+        gid = self._surrogates[pos] = f"~{digest}.{self._copies[digest]}"
+        return gid
+
+    def _record(self, row):
+        return dict(zip(self.header, row))
+
+    def _record_at(self, pos):
+        rec = self._record(self._rows[pos])
+        if pos in self._surrogates: rec[self.header[self._id_col]] = self._surrogates[pos]
+        return rec
+
+    def note_appended(self, start_row, rows):
+        """Registra linhas que nós mesmos acabamos de gravar (resposta do append_rows).
+
+        Só entra no espelho se for a continuação exata do que já conhecemos;
+        senão alguém gravou no meio e o próximo refresh traz tudo.
+        """
+        with self.lock:
+            if self.header and start_row == self.last_row + 1:
+                for values in rows: self._append(values)
+
+    def row_of(self, gid):
+        """Número atual da (primeira) linha do convidado na planilha (ou None)"""
+        with self.lock:
+            positions = self._by_id.get(str(gid))
+            return self._sheet_row(positions[0]) if positions else None
+
+    def rows_of(self, ids):
+        """Números de todas as linhas dos ids conhecidos, do maior para o menor"""
+        with self.lock:
+            return sorted((self._sheet_row(p) for gid in ids for p in self._by_id.get(str(gid), ())), reverse=True)
+
+    def forget(self, ids):
+        """Marca como apagadas as linhas desses ids (depois que a planilha confirmou)"""
+        with self.lock:
+            for gid in ids:
+                for pos in self._by_id.pop(str(gid), ()):
+                    self._rows[pos] = None
+                    bisect.insort(self._deleted, pos)
+
+    def events_on(self, day):
+        """Nomes dos eventos que têm linhas na data (dd/mm/aaaa)"""
+        with self.lock:
+            return list(self._by_day.get(day, {}).values())
+
+    def records(self, day, event, since=0):
+        """Linhas (como dict) de um evento numa data, na ordem da planilha (a partir da posição `since`)"""
+        with self.lock:
+            positions = self._by_key.get((day, str(event).strip().lower()), [])
+            if since: positions = positions[bisect.bisect_left(positions, since):]
+            return [self._record_at(p) for p in positions if self._rows[p] is not None]
+
+    def mark(self):
+        """Até onde o espelho já foi lido, para depois pedir só o que veio depois"""
+        with self.lock: return (self.full_scans, len(self._rows))
+
+    def records_since(self, mark, day, event):
+        """(releu tudo?, linhas do evento depois de `mark`).
+
+        Se houve leitura completa no meio (exclusão ou edição em outro lugar),
+        as posições antigas não valem mais e volta o evento inteiro.
+        """
+        with self.lock:
+            scans, pos = mark or (None, 0)
+            if scans != self.full_scans: return True, self.records(day, event)
+            return False, self.records(day, event, since=pos)
+
+# ==========================================
+# 2. FILA DE ESCRITA EM LOTE (WRITE-BEHIND)
+# ==========================================
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+def status_of(exc):
+    """Código HTTP de um APIError do gspread (None se não veio do Google)"""
+    return getattr(getattr(exc, 'response', None), 'status_code', None)
+
+def is_retryable(exc):
+    """Cota estourada (429), erro 5xx do Google ou queda de rede"""
+    status = status_of(exc)
+    if status is not None: return status in RETRY_STATUS
+    return isinstance(exc, (ConnectionError, TimeoutError, OSError))
+
+class WriteQueue:
+    """Envia para a planilha, em ordem, as operações pendentes ('add' e 'del').
+
+    Uma única thread consome a fila e só pega o próximo lote depois que o
+    Google confirmou o anterior, então a ordem de chegada é mantida. Inclusões
+    seguidas viram um único append_rows (até `max_rows` ou a cada `flush_ms`).
+    Erros 429/5xx/rede são repetidos com backoff exponencial; o que falhar de
+    vez fica em `failed` para reenvio. Com um `journal`, tudo é gravado antes
+    no diário local e o que sobrou de uma execução anterior é reenviado.
+
+    `partition_of(data)` diz em qual partição (página) cada linha mora;
+    `get_sheet(partição)` e `get_index(partição)` entregam a página e o seu
+    índice id→linha. Um lote nunca mistura partições. `on_error(partição,
+    exc)` fica sabendo de cada falha (ex.: para esquecer uma página em cache).
+    """
+
+    def __init__(self, get_sheet, journal=None, get_index=None, partition_of=None, flush_ms=500, max_rows=50, max_retries=6, max_backoff=30.0, offline_wait=5.0, on_error=None):
+        self._get_sheet = get_sheet
+        self._on_error = on_error
+        self.journal = journal
+        self._get_index = get_index or (lambda part: None)
+        self._partition_of = partition_of or (lambda day: None)
+        self.flush_ms, self.max_rows = flush_ms, max_rows
+        self.max_retries, self.max_backoff, self.offline_wait = max_retries, max_backoff, offline_wait
+        self._queue = collections.deque()   # (op, seq no diário, carga, partição)
+        self._inflight = []
+        self._failed = []
+        self._cond = threading.Condition()
+        self.sent = 0
+        self.last_error = None
+        if journal: self._queue.extend((op, seq, payload, self._partition_of(day)) for op, seq, payload, day in journal.unsynced())
+        threading.Thread(target=self._run, name="buffet-write-queue", daemon=True).start()
+
+    @property
+    def pending(self):
+        with self._cond: return len(self._queue) + len(self._inflight)
+
+    @property
+    def failed(self):
+        with self._cond: return len(self._failed)
+
+    def put(self, guest):
+        self.put_many([guest])
+
+    def put_many(self, guests):
+        if self.journal:
+            # seq None = o diário já tinha a linha (já na fila ou veio da planilha): não reenvia
+            guests = [(seq, g) for seq, g in zip(self.journal.append(guests), guests) if seq is not None]
+        else: guests = [(None, g) for g in guests]
+        if not guests: return
+        with self._cond:
+            self._queue.extend(('add', seq, to_sheet_row(g), self._partition_of(g.get('Data'))) for seq, g in guests)
+            self._cond.notify()
+
+    def put_delete(self, guest):
+        seq = self.journal.delete(guest) if self.journal else None
+        with self._cond:
+            self._queue.append(('del', seq, str(guest.get('id')), self._partition_of(guest.get('Data'))))
+            self._cond.notify()
+
+    def requeue_failed(self):
+        """Devolve as operações que falharam para o começo da fila"""
+        with self._cond:
+            self._queue.extendleft(reversed(self._failed))
+            self._failed = []
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue: self._cond.wait()
+                # Espera o lote encher ou o prazo vencer
+                deadline = time.monotonic() + self.flush_ms / 1000
+                while len(self._queue) < self.max_rows:
+                    left = deadline - time.monotonic()
+                    if left <= 0: break
+                    self._cond.wait(left)
+                op, _, _, part = self._queue[0]
+                batch = []
+                while self._queue and len(batch) < self.max_rows and (self._queue[0][0], self._queue[0][3]) == (op, part):
+                    batch.append(self._queue.popleft())
+                self._inflight = batch
+
+            ok = self._send(op, part, [e[2] for e in batch])
+            if ok and self.journal: self.journal.mark_synced([e[1] for e in batch if e[1]])
+            with self._cond:
+                self._inflight = []
+                if ok: self.sent += len(batch)
+                else: self._failed.extend(batch)
+
+    def _send(self, op, part, payloads):
+        attempt = 0
+        while True:
+            try:
+                sheet = self._get_sheet(part)
+                if sheet is None:
+                    # Sem rede: continua pendente (o diário guarda) e tenta de novo depois
+                    time.sleep(self.offline_wait)
+                    continue
+                index = self._get_index(part)
+                if op == 'add': self._append(sheet, index, payloads, retry=attempt > 0)
+                else: self._delete(sheet, index, payloads)
+                return True
+            except Exception as e:
+                self.last_error = e
+                if self._on_error:
+                    # Um aviso que falha não pode derrubar a única thread da fila
+                    try: self._on_error(part, e)
+                    except Exception as cb: METRICS.error('queue.on_error', cb)
+                attempt += 1
+                if not is_retryable(e) or attempt > self.max_retries: return False
+                METRICS.count('queue.retries')
+                time.sleep(min(self.max_backoff, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+    def _append(self, sheet, index, rows, retry=False):
+        if retry and index:
+            # Timeout/5xx pode chegar depois de o Google gravar: não grava de novo o que já está lá
+            with index.lock:
+                index.refresh(sheet)
+                rows = [r for r in rows if not (r[0] and index.row_of(r[0]))]
+            if not rows: return
+        with METRICS.timed('sheets.append_rows'): resp = sheet.append_rows(rows)
+        start = _updated_start_row(resp)
+        if index and start: index.note_appended(start, rows)
+
+    def _delete(self, sheet, index, ids):
+        """Apaga pelas linhas conhecidas no índice: uma linha = delete_rows, várias = um batch_update"""
+        if not index:
+            for gid in ids:
+                while True: # Apaga todas as linhas do id
+                    with METRICS.timed('sheets.find'): cell = sheet.find(gid, in_column=1)
+                    if not cell: break
+                    with METRICS.timed('sheets.delete_rows'): sheet.delete_rows(cell.row)
+            return
+        with index.lock:
+            index.refresh(sheet)
+            rows = index.rows_of(ids)
+            if len(rows) == 1:
+                with METRICS.timed('sheets.delete_rows'): sheet.delete_rows(rows[0])
+            elif rows:
+                with METRICS.timed('sheets.batch_update'):
+                    sheet.spreadsheet.batch_update({"requests": delete_rows_requests(sheet.id, rows)})
+            index.forget(ids)
+
+def _updated_start_row(resp):
+    """Primeira linha gravada, tirada de updates.updatedRange ('Página1!A10:H12')"""
+    try: rng = resp['updates']['updatedRange']
+    except (TypeError, KeyError): return None
+    m = re.match(r"\$?[A-Z]+\$?(\d+)", rng.rsplit('!', 1)[-1])
+    return int(m.group(1)) if m else None
+
+def delete_rows_requests(sheet_id, rows):
+    """Pedidos deleteDimension para um batch_update, juntando linhas vizinhas.
+
+    `rows` vem do maior para o menor, então apagar um bloco não desloca os
+    blocos que ainda vão ser apagados.
+    """
+    blocks = []
+    for r in rows:
+        if blocks and blocks[-1][0] == r + 1: blocks[-1][0] = r
+        else: blocks.append([r, r])
+    return [{"deleteDimension": {"range": {"sheetId": sheet_id, "dimension": "ROWS", "startIndex": lo - 1, "endIndex": hi}}}
+            for lo, hi in blocks]
+
+# ==========================================
+# 3. DIÁRIO LOCAL (SQLITE / WAL)
+# ==========================================
+
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,                   -- 'add' ou 'del'
+    id TEXT NOT NULL, Nome TEXT, Tipo TEXT, Idade TEXT, Status TEXT,
+    Hora TEXT, Data TEXT, Evento TEXT,
+    evento_key TEXT NOT NULL,           -- Evento sem espaços e minúsculo
+    synced REAL NOT NULL DEFAULT 0      -- 0 = pendente; senão, quando foi confirmado
+);
+-- Marcadores de início (id 'SYSTEM') se repetem quando a festa é recriada com outro limite:
+-- para eles a hora e o limite também contam, e vale o mais novo
+DROP INDEX IF EXISTS journal_add;
+CREATE UNIQUE INDEX IF NOT EXISTS journal_add_v2 ON journal(id, Data, evento_key,
+    (CASE WHEN Status = 'SYSTEM_START' THEN Hora || '|' || Idade ELSE '' END)) WHERE op = 'add';
+CREATE INDEX IF NOT EXISTS journal_event ON journal(Data, evento_key);
+CREATE INDEX IF NOT EXISTS journal_del ON journal(id, Data, evento_key) WHERE op = 'del';
+CREATE INDEX IF NOT EXISTS journal_pending ON journal(seq) WHERE synced = 0;
+"""
+
+def _event_key(event):
+    return str(event).strip().lower()
+
+class LocalJournal:
+    """Diário local append-only: é a cópia primária dos convidados.
+
+    Cada inclusão ou exclusão vira uma linha nova (nada é reescrito). Em modo
+    WAL com synchronous=NORMAL um commit leva bem menos de 1 ms e sobrevive a
+    queda do processo, então a portaria funciona mesmo sem internet.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        with self.lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(JOURNAL_SCHEMA)
+
+    def close(self):
+        with self.lock: self._db.close()
+
+    def _insert(self, op, guest, synced=0):
+        gid = str(guest.get('id') or guest.get('ID') or '')
+        cur = self._db.execute(
+            "INSERT OR IGNORE INTO journal (op, id, Nome, Tipo, Idade, Status, Hora, Data, Evento, evento_key, synced) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (op, gid, guest.get('Nome'), guest.get('Tipo'), str(guest.get('Idade')), guest.get('Status'),
+             guest.get('Hora'), str(guest.get('Data', '')).strip(), guest.get('Evento'),
+             _event_key(guest.get('Evento', '')), synced))
+        return cur.lastrowid if cur.rowcount else None
+
+    def append(self, guests, synced=0):
+        """Grava convidados numa única transação. Retorna os seqs (None se já existia)."""
+        with self.lock:
+            self._db.execute("BEGIN")
+            try: seqs = [self._insert('add', g, synced) for g in guests]
+            except Exception:
+                self._db.execute("ROLLBACK"); raise
+            self._db.execute("COMMIT")
+            return seqs
+
+    def delete(self, guest, synced=0):
+        with self.lock:
+            return self._insert('del', guest, synced)
+
+    def mark_synced(self, seqs):
+        if not seqs: return
+        with self.lock:
+            self._db.executemany("UPDATE journal SET synced = ? WHERE seq = ?", [(time.time(), s) for s in seqs])
+
+    def unsynced(self):
+        """Operações não confirmadas pela planilha, em ordem: (op, seq, carga, Data)"""
+        with self.lock:
+            cur = self._db.execute(
+                "SELECT op, seq, id, Nome, Tipo, Idade, Status, Hora, Data, Evento FROM journal WHERE synced = 0 ORDER BY seq")
+            return [(op, seq, list(rest) if op == 'add' else rest[0], rest[6]) for op, seq, *rest in cur]
+
+    def _live(self, day, event):
+        return self._db.execute(
+            "SELECT a.seq, a.id, a.Nome, a.Tipo, a.Idade, a.Status, a.Hora, a.Data, a.Evento, a.synced FROM journal a "
+            "WHERE a.op = 'add' AND a.Data = ? AND a.evento_key = ? AND NOT EXISTS ("
+            "SELECT 1 FROM journal d WHERE d.op = 'del' AND d.id = a.id AND d.Data = a.Data AND d.evento_key = a.evento_key) "
+            "ORDER BY a.seq", (day, _event_key(event))).fetchall()
+
+    def rows(self, day, event):
+        """Convidados vivos (sem exclusão) de um evento numa data, do mais antigo ao mais novo"""
+        with self.lock:
+            return [dict(zip(HEADERS, r[1:9])) for r in self._live(day, event)]
+
+    def events_on(self, day):
+        with self.lock:
+            cur = self._db.execute("SELECT Evento FROM journal WHERE Data = ? AND op = 'add' GROUP BY evento_key", (day,))
+            return [r[0] for r in cur]
+
+    def deleted(self, day, event, ids):
+        """Quais desses ids já têm exclusão registrada no diário"""
+        ids, found = [str(i) for i in ids], set()
+        with self.lock:
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                cur = self._db.execute(
+                    f"SELECT id FROM journal WHERE op = 'del' AND Data = ? AND evento_key = ? AND id IN ({','.join('?' * len(part))})",
+                    (day, _event_key(event), *part))
+                found.update(r[0] for r in cur)
+        return found
+
+    def merge(self, day, event, sheet_records, seen_at, tombstone=True):
+        """Traz para o diário as linhas que outras portarias gravaram na planilha.
+
+        Com `tombstone` (a lista é o evento inteiro), linhas já sincronizadas
+        antes de `seen_at` que sumiram da planilha foram excluídas em outro
+        lugar e recebem um 'del' local. Para só a cauda nova, use False.
+        """
+        sheet_ids = {str(r.get('id') or r.get('ID') or '') for r in sheet_records}
+        with self.lock:
+            self._db.execute("BEGIN")
+            try:
+                for r in sheet_records: self._insert('add', r, seen_at)
+                for seq, gid, *rest, synced in (self._live(day, event) if tombstone else ()):
+                    if synced and synced < seen_at and gid not in sheet_ids:
+                        self._insert('del', dict(zip(HEADERS, [gid] + rest)), seen_at)
+            except Exception:
+                self._db.execute("ROLLBACK"); raise
+            self._db.execute("COMMIT")
+
+# ==========================================
+# 4. ESTADO COMPARTILHADO DO EVENTO
+# ==========================================
+
+COUNT_KEYS = ('total', 'paying', 'cortesia', 'children_total')
+
+class EventStore:
+    """Convidados de um Evento/Data compartilhados por todas as sessões do processo.
+
+    Cada tablet da portaria abre uma sessão Streamlit; todas apontam para o
+    mesmo objeto, então uma inclusão aparece nas outras sem reler a planilha.
+    `version` sobe a cada mudança para a sessão saber se precisa redesenhar.
+
+    Os contadores dos cards (pagantes, cortesias, crianças...), o índice de
+    duplicados (nome normalizado + idade) e o histograma de chegadas são
+    mantidos a cada inclusão/exclusão em O(1); nada é recontado a cada rerun.
+    """
+
+    def __init__(self, event, day):
+        self.event, self.day = str(event).strip(), day
+        self.lock = threading.RLock()
+        self.version = 0
+        self.loaded = False
+        self.limit = 100
+        self._guests = {}   # id -> convidado, do mais antigo ao mais novo
+        self.guest_list = None   # GuestListIndex da lista contratada (opcional)
+        self._counts = dict.fromkeys(COUNT_KEYS, 0)
+        self._dups = {}     # dup_key -> {ids}
+        self.arrivals = ArrivalHistogram(day)
+
+    def _track(self, g, step):
+        self.arrivals.add(g, step)
+        c = self._counts
+        c['total'] += step
+        if g.get('_is_paying'): c['paying'] += step
+        if g.get('Tipo') == 'Cortesia': c['cortesia'] += step
+        if g.get('Tipo') == 'Criança': c['children_total'] += step
+        key = dup_key(g)
+        if key is None: return
+        if step > 0: self._dups.setdefault(key, set()).add(g['id'])
+        else:
+            ids = self._dups.get(key)
+            if ids:
+                ids.discard(g['id'])
+                if not ids: del self._dups[key]
+
+    def load(self, guests, limit):
+        """Substitui a lista (vem do mais novo para o mais antigo, como load_data_from_sheets)"""
+        with self.lock:
+            self._guests = {}
+            self._counts = dict.fromkeys(COUNT_KEYS, 0)
+            self._dups = {}
+            self.arrivals = ArrivalHistogram(self.day)
+            for g in reversed(guests): self._put(g)
+            self.limit = limit
+            self.loaded = True
+            self.version += 1
+
+    def set_limit(self, limit):
+        with self.lock:
+            self.limit = limit
+            self.version += 1
+
+    def _put(self, g):
+        old = self._guests.pop(g['id'], None)
+        if old: self._track(old, -1)
+        self._guests[g['id']] = g
+        self._track(g, +1)
+
+    def add(self, guest):
+        self.add_many([guest])
+
+    def add_many(self, guests):
+        with self.lock:
+            for g in guests: self._put(g)
+            self.version += 1
+
+    def remove(self, gid):
+        """Tira o convidado pelo id e devolve o dict removido (ou None)"""
+        with self.lock:
+            g = self._guests.pop(gid, None)
+            if g:
+                self._track(g, -1)
+                self.version += 1
+            return g
+
+    def __contains__(self, gid):
+        with self.lock: return gid in self._guests
+
+    def duplicate_of(self, parsed):
+        """Convidado já registrado com o mesmo nome e idade (o mais recente), ou None"""
+        with self.lock:
+            key = dup_key(parsed)
+            ids = self._dups.get(key) if key else None
+            if not ids: return None
+            return max((self._guests[i] for i in ids), key=_id_order)
+
+    def recent(self, n):
+        """Os `n` registros mais novos, sem copiar a lista toda"""
+        with self.lock:
+            return list(itertools.islice(reversed(self._guests.values()), n))
+
+    def guests(self):
+        """Lista completa (mais novo primeiro), para as telas que precisam de tabela"""
+        with self.lock:
+            return list(reversed(self._guests.values()))
+
+    def columns(self, fields):
+        """Colunas (nome -> lista, mais novo primeiro) para o PDF, sem montar DataFrame"""
+        with self.lock:
+            rows = list(reversed(self._guests.values()))
+        return {f: [g.get(f, '-') for g in rows] for f in fields}
+
+    def arrival_window(self):
+        """Faixas com chegadas (rótulos e séries) para o gráfico, em O(faixas)"""
+        with self.lock: return self.arrivals.window()
+
+    def counts(self):
+        """total, paying, free, cortesia e children_total, como no relatório"""
+        with self.lock:
+            c = dict(self._counts)
+        c['free'] = c['total'] - c['paying'] - c['cortesia']
+        return c
+
+NIGHT_END_H = 6 # Até as 6h a festa de ontem ainda está aberta (check-in e fechamento de madrugada)
+
+def next_day(day):
+    """dd/mm/aaaa do dia seguinte"""
+    return (datetime.strptime(day, "%d/%m/%Y") + timedelta(days=1)).strftime("%d/%m/%Y")
+
+def party_date(now, night_end_h=NIGHT_END_H):
+    """Dia (dd/mm/aaaa) da festa em andamento neste horário: de madrugada ainda é a de ontem"""
+    if now.hour < night_end_h: now -= timedelta(days=1)
+    return now.strftime("%d/%m/%Y")
+
+_DIGITS = re.compile(r'\d+')
+
+class ArrivalHistogram:
+    """Chegadas por faixa de 15 min, do dia do evento até o fim do dia seguinte.
+
+    Um vetor de tamanho fixo por série, indexado por (dia, hora, minuto), então
+    quem chega depois da meia-noite cai depois das 23:45 e não antes das 00:15
+    do mesmo dia. Horários fora dessa janela só entram em `outside`.
+    """
+
+    SERIES = ('total', 'paying', 'free', 'cortesia', 'children')
+
+    def __init__(self, day, days=2, slot_min=15):
+        self.day = str(day).strip()
+        self.slot_min = slot_min
+        self.per_day = 24 * 60 // slot_min
+        self.size = days * self.per_day
+        try: self._start = datetime.strptime(self.day, "%d/%m/%Y").date()
+        except ValueError: self._start = None
+        self._offsets = {self.day: 0}   # Data -> dias depois do evento (parse só uma vez por data)
+        self.counts = {name: [0] * self.size for name in self.SERIES}
+        self.outside = 0
+
+    def _day_offset(self, data):
+        data = str(data or self.day).strip()
+        off = self._offsets.get(data)
+        if off is None:
+            try: off = (datetime.strptime(data, "%d/%m/%Y").date() - self._start).days
+            except (TypeError, ValueError): off = -1
+            self._offsets[data] = off
+        return off
+
+    def slot(self, guest):
+        """Índice da faixa do convidado, ou None se fora da janela"""
+        hora = str(guest.get('Hora', ''))
+        try: h, m = int(hora[:2]), int(hora[3:5])
+        except ValueError: return None
+        if hora[2:3] != ':' or not (0 <= h < 24 and 0 <= m < 60): return None
+        i = self._day_offset(guest.get('Data')) * self.per_day + (h * 60 + m) // self.slot_min
+        return i if 0 <= i < self.size else None
+
+    def add(self, guest, step=1):
+        i = self.slot(guest)
+        if i is None:
+            self.outside += step
+            return
+        c = self.counts
+        c['total'][i] += step
+        if guest.get('_is_paying'): c['paying'][i] += step
+        elif guest.get('Tipo') == 'Cortesia': c['cortesia'][i] += step
+        else: c['free'][i] += step
+        if guest.get('Tipo') == 'Criança': c['children'][i] += step
+
+    def label(self, i):
+        day, minute = divmod(i, self.per_day)
+        minute *= self.slot_min
+        return f"{minute // 60:02d}:{minute % 60:02d}" + (f" (+{day})" if day else "")
+
+    def window(self):
+        """(rótulos, {série: contagens}) da primeira à última faixa com chegadas"""
+        total = self.counts['total']
+        used = [i for i in range(self.size) if total[i]]
+        if not used: return [], {name: [] for name in self.SERIES}
+        lo, hi = used[0], used[-1] + 1
+        return [self.label(i) for i in range(lo, hi)], {name: values[lo:hi] for name, values in self.counts.items()}
+
+class ChangePoller:
+    """Quando olhar a planilha de novo; um por página, seja quantos eventos ela tiver.
+
+    Só um por vez consulta (claim/release). Se algo mudou (linhas de outra
+    portaria ou inclusões aqui), o intervalo volta ao mínimo; parado, cresce
+    `backoff` vezes a cada consulta até `max_interval`.
+    """
+
+    def __init__(self, min_interval=3.0, max_interval=30.0, backoff=1.5):
+        self.min_interval, self.max_interval, self.backoff = min_interval, max_interval, backoff
+        self.interval = min_interval
+        self.next_at = 0.0
+        self.polls = 0
+        self._version = None
+        self._busy = threading.Lock()
+
+    def claim(self, now):
+        """True se é a vez de consultar e ninguém está consultando (depois chame release)"""
+        return now >= self.next_at and self._busy.acquire(blocking=False)
+
+    def release(self, now, changed, version=None):
+        if self._version is not None and version != self._version: changed = True
+        self._version = version
+        self.interval = self.min_interval if changed else min(self.max_interval, self.interval * self.backoff)
+        self.next_at = now + self.interval
+        self.polls += 1
+        self._busy.release()
+
+class PageWatcher:
+    """Thread que mantém o espelho (SheetIndex) de uma página em dia, no ritmo do ChangePoller.
+
+    Um refresh por página serve todos os eventos dela, e a espera pela rede
+    fica fora das sessões: a tela só aplica o que o espelho já tem. Enquanto
+    alguém chamar `touch()` a thread segue viva; parada por `idle_after` s,
+    ela termina e volta no próximo `touch()`.
+    """
+
+    def __init__(self, get_sheet, index, min_interval=3.0, max_interval=30.0, idle_after=600, on_error=None):
+        self._get_sheet, self.index = get_sheet, index
+        self._on_error = on_error
+        self.poller = ChangePoller(min_interval, max_interval)
+        self.idle_after = idle_after
+        self.wanted_at = 0.0
+        self.last_error = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def touch(self):
+        self.wanted_at = time.monotonic()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="buffet-page-watcher", daemon=True)
+                self._thread.start()
+
+    def poll_once(self):
+        """Uma consulta (se for a hora); True se chegou algo novo"""
+        if not self.poller.claim(time.monotonic()): return False
+        changed = False
+        try:
+            sheet = self._get_sheet()
+            if sheet is not None:
+                with METRICS.timed('app.poll'): changed = self.index.refresh(sheet) > 0
+        except Exception as e: # Contado nas métricas; tenta de novo na próxima vez
+            self.last_error = e
+            if self._on_error:
+                try: self._on_error(e)
+                except Exception as cb: METRICS.error('app.poll.on_error', cb)
+        finally: self.poller.release(time.monotonic(), changed, self.index.mark())
+        return changed
+
+    def _run(self):
+        while time.monotonic() - self.wanted_at < self.idle_after:
+            wait = self.poller.next_at - time.monotonic()
+            if wait > 0: time.sleep(min(wait, 1.0))
+            else: self.poll_once()
+
+# Nomes que não identificam ninguém (o parser usa 'Criança' quando só a idade foi digitada)
+PLACEHOLDER_NAMES = frozenset(['', 'crianca'])
+
+def dup_key(guest):
+    """Chave de duplicidade: nome sem acento/pontuação + idade ('5 anos' e '5' são iguais); None sem nome de verdade"""
+    name = normalize_name(guest.get('Nome', ''))
+    if name in PLACEHOLDER_NAMES: return None
+    age = _DIGITS.search(str(guest.get('Idade', '')))
+    return name, age.group() if age else ''
+
+def find_duplicate_groups(guests):
+    """Passada única (O(n)) sobre as linhas de um evento: grupos com a mesma chave, do mais antigo ao mais novo"""
+    groups = {}
+    for g in guests:
+        key = dup_key(g)
+        if key is not None: groups.setdefault(key, []).append(g)
+    return [sorted(gs, key=_id_order) for gs in groups.values() if len(gs) > 1]
+
+def _id_order(guest):
+    """Ordem cronológica dos ids (timestamp de 20 dígitos, com sufixo nos lotes)"""
+    gid = str(guest.get('id'))
+    return gid[:20].zfill(20), gid
+
+# ==========================================
+# 5. RELATÓRIO PDF
+# ==========================================
+
+PDF_COLUMNS = [("Nome", 80, 'L'), ("Tipo", 30, 'C'), ("Idade", 30, 'C'), ("Status", 30, 'C'), ("Hora", 20, 'C')]
+PDF_ROW_H = 8
+_SEP = '\x1f'
+
+def _latin1_column(values):
+    """Converte uma coluna inteira para latin-1 com um único encode"""
+    joined = _SEP.join('-' if v is None else str(v).replace(_SEP, ' ') for v in values)
+    return joined.encode('latin-1', 'replace').decode('latin-1').split(_SEP) if values else []
+
+def build_report_pdf(party_name, columns, p_counts, guest_limit, generated_at, logo=None, free_age=7):
+    """Monta o relatório a partir de colunas (dict nome -> lista), sem DataFrame.
+
+    As linhas saem de listas já convertidas para latin-1; quando a página
+    enche, abre outra e repete o cabeçalho da tabela.
+    """
+    from fpdf import FPDF
+    from fpdf.enums import XPos, YPos
+    next_line = dict(new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    same_line = dict(new_x=XPos.RIGHT, new_y=YPos.TOP)
+
+    pdf = FPDF()
+    pdf.add_page()
+    if logo:
+        try: pdf.image(logo, x=10, y=10, w=40)
+        except Exception: pass
+
+    pdf.set_font("Helvetica", 'B', 16)
+    pdf.set_xy(55, 15)
+    pdf.set_text_color(106, 27, 154)
+    pdf.cell(0, 10, f"Relatório Final: {party_name}", **next_line)
+
+    pdf.set_xy(55, 23)
+    pdf.set_font("Helvetica", size=10)
+    pdf.set_text_color(50, 50, 50)
+    pdf.cell(0, 10, f"Gerado em: {generated_at}", **next_line)
+    pdf.ln(20)
+
+    # Resumo
+    pdf.set_fill_color(106, 27, 154); pdf.set_text_color(255, 255, 255)
+    pdf.set_font("Helvetica", 'B', 12); pdf.cell(0, 10, "  Resumo", fill=True, **next_line)
+    pdf.set_text_color(0, 0, 0); pdf.set_font("Helvetica", size=12); pdf.ln(2)
+
+    pdf.cell(0, 8, f"Limite Contratado: {guest_limit}", **next_line)
+    pdf.cell(0, 8, f"Total Presente: {p_counts['total']}", **next_line)
+    pdf.ln(2)
+    pdf.cell(0, 8, f"Pagantes: {p_counts['paying']}", **next_line)
+    pdf.cell(0, 8, f"Isentos (<={free_age}): {p_counts['free']}", **next_line)
+    pdf.cell(0, 8, f"Cortesias: {p_counts['cortesia']}", **next_line)
+    pdf.ln(10)
+
+    # Tabela
+    def table_header():
+        pdf.set_font("Helvetica", 'B', 10)
+        pdf.set_fill_color(106, 27, 154); pdf.set_text_color(255, 255, 255)
+        for i, (name, w, align) in enumerate(PDF_COLUMNS):
+            pdf.cell(w, PDF_ROW_H, name, 1, align=align, fill=True, **(next_line if i == len(PDF_COLUMNS) - 1 else same_line))
+        pdf.set_text_color(0, 0, 0); pdf.set_font("Helvetica", size=10)
+
+    table_header()
+    cols = [_latin1_column(columns.get(name, [])) for name, _, _ in PDF_COLUMNS]
+    n = max(map(len, cols), default=0)
+    cols = [c + ['-'] * (n - len(c)) for c in cols]
+
+    # Linhas desenhadas direto (retângulo + divisórias + texto): bem mais
+    # barato que 5 pdf.cell por convidado em listas de milhares de pessoas
+    widths = [(w, align) for _, w, align in PDF_COLUMNS]
+    x0, total_w = pdf.l_margin, sum(w for w, _ in widths)
+    dividers = list(itertools.accumulate(w for w, _ in widths[:-1]))
+    baseline = PDF_ROW_H / 2 + .3 * pdf.font_size
+    text_w = {}
+    bottom = pdf.page_break_trigger
+    pdf.set_fill_color(240, 240, 245)
+    y = pdf.get_y()
+    for i, vals in enumerate(zip(*cols)):
+        if y + PDF_ROW_H > bottom:
+            pdf.add_page()
+            table_header()
+            pdf.set_fill_color(240, 240, 245)
+            y = pdf.get_y()
+        pdf.rect(x0, y, total_w, PDF_ROW_H, style='DF' if i % 2 else 'D')
+        for d in dividers: pdf.line(x0 + d, y, x0 + d, y + PDF_ROW_H)
+        left = x0
+        for v, (w, align) in zip(vals, widths):
+            if align == 'L': tx = left + pdf.c_margin
+            else:
+                sw = text_w.get(v)
+                if sw is None: sw = text_w[v] = pdf.get_string_width(v)
+                tx = left + (w - sw) / 2
+            pdf.text(tx, y + baseline, v)
+            left += w
+        y += PDF_ROW_H
+    pdf.set_y(y)
+
+    try: return bytes(pdf.output())
+    except TypeError: return pdf.output(dest='S').encode('latin-1')
+
+# ==========================================
+# 6. SMART PARSER
+# ==========================================
+
+CORTESIA_WORDS = frozenset(['mãe', 'mae', 'pai', 'irmao', 'irmão', 'irma', 'irmã', 'fotografo', 'fotógrafo', 'staff', 'baba', 'babá', 'avó', 'avô', 'cortesia'])
+
+class GuestParser:
+    """Interpreta o que a recepção digita: 'Carlos', 'Helena 6', 'Maria Mãe'.
+
+    Palavras e expressões regulares são montadas uma vez só. `parse_batch`
+    aceita várias pessoas coladas de uma vez ('Ana 5, João 9, Maria mãe').
+    """
+
+    _AGE = re.compile(r'(\d+)')
+    _AGE_WORDS = re.compile(r'\d+\s*(anos|ano|a)?', re.IGNORECASE)
+    _SPLIT = re.compile(r'[\n;,]+')
+    _ONLY_AGE = re.compile(r'^\d+\s*(anos|ano|a)?$', re.IGNORECASE)
+    _PUNCT = str.maketrans({',': ' ', '-': ' '})
+
+    def __init__(self, free_age=7, cortesia_words=CORTESIA_WORDS):
+        self.free_age = free_age
+        self.cortesia_words = frozenset(w.lower() for w in cortesia_words)
+
+    def parse(self, text):
+        text = text.strip()
+        if not text: return None
+        words = text.lower().translate(self._PUNCT).split()
+
+        if not self.cortesia_words.isdisjoint(words):
+            return {"Nome": text.title(), "Tipo": "Cortesia", "Idade": "-", "Status": "Cortesia", "_is_paying": False}
+
+        match = self._AGE.search(text)
+        if match:
+            age = int(match.group(1))
+            clean_name = self._AGE_WORDS.sub('', text).strip()
+            if not clean_name: clean_name = "Criança"
+            is_paying = age > self.free_age
+            return {"Nome": clean_name.title(), "Tipo": "Criança", "Idade": f"{age} anos", "Status": "Pagante" if is_paying else "Isento", "_is_paying": is_paying}
+
+        return {"Nome": text.title(), "Tipo": "Adulto", "Idade": "-", "Status": "Pagante", "_is_paying": True}
+
+    def split(self, text):
+        """Separa por linha, vírgula ou ';'. Um pedaço que é só parentesco
+        ('Maria, mãe') ou só a idade ('Helena, 6') volta a se juntar com a
+        pessoa anterior (se ela ainda não tem idade)."""
+        people = []
+        for part in self._SPLIT.split(text):
+            part = part.strip()
+            if not part: continue
+            words = part.lower().translate(self._PUNCT).split()
+            if people and words and self.cortesia_words.issuperset(words): people[-1] += f" {part}"
+            elif people and self._ONLY_AGE.match(part) and not self._AGE.search(people[-1]): people[-1] += f" {part}"
+            else: people.append(part)
+        return people
+
+    def parse_batch(self, text):
+        return [p for p in map(self.parse, self.split(text)) if p]
+
+DEFAULT_PARSER = GuestParser()
+
+def parse_input_text(text):
+    return DEFAULT_PARSER.parse(text)
+
+# ==========================================
+# 7. LISTA DE CONVIDADOS PRÉ-EVENTO (BUSCA)
+# ==========================================
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+def normalize_name(text):
+    """Minúsculo, sem acento e só com letras/números: 'Conceição-Maria' -> 'conceicao maria'"""
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(' ', text).strip()
+
+def _trigrams(norm):
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class GuestListIndex:
+    """Índice da lista contratada para sugerir nomes enquanto a recepção digita.
+
+    Dois índices invertidos: prefixos de cada palavra (até PREFIX_LEN letras)
+    para o caso comum de digitar o começo do nome, e trigramas para tolerar
+    erros de digitação. Uma busca só toca nas listas dos termos digitados,
+    não na lista inteira.
+    """
+
+    PREFIX_LEN = 6
+
+    def __init__(self, entries):
+        self.entries = list(entries)     # dicts com 'Nome' e opcionalmente 'Idade'
+        self._norm = [normalize_name(e.get('Nome', '')) for e in self.entries]
+        self._prefix = {}
+        self._tri = {}
+        self._tri_len = []   # quantos trigramas cada nome tem (desempate: nomes mais curtos)
+        for i, norm in enumerate(self._norm):
+            for word in set(norm.split()):
+                for k in range(1, min(len(word), self.PREFIX_LEN) + 1):
+                    self._prefix.setdefault(word[:k], []).append(i)
+            tris = _trigrams(norm)
+            self._tri_len.append(len(tris))
+            for t in tris: self._tri.setdefault(t, []).append(i)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, query, limit=8, min_score=0.4):
+        """Até `limit` entradas: primeiro as que começam com o que foi digitado, depois as parecidas"""
+        q = normalize_name(query)
+        if not q: return []
+        words = q.split()
+
+        # 1. Todas as palavras digitadas são começo de alguma palavra do nome
+        hits = None
+        for w in words:
+            posting = set(self._prefix.get(w[:self.PREFIX_LEN], ()))
+            if len(w) > self.PREFIX_LEN:
+                posting = {i for i in posting if any(x.startswith(w) for x in self._norm[i].split())}
+            hits = posting if hits is None else hits & posting
+            if not hits: break
+        ranked = heapq.nsmallest(limit, hits or (), key=lambda i: (len(self._norm[i]), self._norm[i]))
+
+        # 2. Completa com os mais parecidos: fração dos trigramas digitados que o nome tem
+        if len(ranked) < limit:
+            q_tris = _trigrams(q)
+            shared = collections.Counter()
+            for t in q_tris: shared.update(self._tri.get(t, ()))
+            seen = set(ranked)
+            scored = []
+            for i, n in shared.items():
+                if i in seen: continue
+                score = n / len(q_tris)
+                if score >= min_score: scored.append((-score, self._tri_len[i], i))
+            ranked += [i for _, _, i in heapq.nsmallest(limit - len(ranked), scored)]
+        return [self.entries[i] for i in ranked]
+
+def guest_list_entries(df):
+    """Converte a planilha importada (DataFrame) em entradas: acha 'Nome' e 'Idade' sem ligar para maiúsculas"""
+    cols = {str(c).strip().lower(): c for c in df.columns}
+    name_col = cols.get('nome') or cols.get('convidado') or df.columns[0]
+    ages = df[cols['idade']].tolist() if 'idade' in cols else [None] * len(df)
+    entries = []
+    for name, age in zip(df[name_col].tolist(), ages):
+        if name is None or str(name).strip() in ('', 'nan'): continue
+        entry = {'Nome': str(name).strip()}
+        if isinstance(age, float) and age.is_integer(): age = int(age)
+        if age is not None and str(age).strip() not in ('', 'nan'): entry['Idade'] = str(age).strip()
+        entries.append(entry)
+    return entries
+
+def guest_list_text(entry):
+    """Texto que o parser entende para a entrada escolhida ('Ana 5', 'Carlos').
+
+    Vírgula, ';' e quebra de linha separam pessoas no parser: no nome da lista
+    ('Souza, Ana') viram espaço, para continuar sendo um convidado só.
+    """
+    name = " ".join(GuestParser._SPLIT.sub(' ', str(entry['Nome'])).split())
+    age = re.match(r'\s*(\d+)', str(entry.get('Idade', '')))
+    return f"{name} {age.group(1)}" if age else name
+
+# ==========================================
+# 8. PARTIÇÕES (UMA PÁGINA POR DIA OU MÊS) E ARQUIVO
+# ==========================================
+
+PARTITION_FORMATS = {'dia': "%Y-%m-%d", 'mes': "%Y-%m"}
+
+def partition_title(day, mode):
+    """Nome da página onde moram as linhas de uma data dd/mm/aaaa (None = sheet1, sem partição)"""
+    if not mode: return None
+    try: return datetime.strptime(str(day).strip(), "%d/%m/%Y").strftime(PARTITION_FORMATS[mode])
+    except ValueError: return None
+
+def partition_end(title, mode):
+    """Último dia coberto pela página, ou None se o título não é de partição"""
+    try: start = datetime.strptime(title, PARTITION_FORMATS[mode]).date()
+    except (KeyError, ValueError): return None
+    if mode == 'dia': return start
+    nxt = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return nxt - timedelta(days=1)
+
+def open_partition(spreadsheet, title, width=len(HEADERS)):
+    """Abre a página da partição, criando com cabeçalho se ainda não existe"""
+    try:
+        with METRICS.timed('sheets.worksheet', expected=WorksheetNotFound): return spreadsheet.worksheet(title)
+    except WorksheetNotFound: pass
+    try:
+        with METRICS.timed('sheets.add_worksheet'): ws = spreadsheet.add_worksheet(title=title, rows=1000, cols=width)
+    except Exception:
+        # Outro servidor criou ao mesmo tempo
+        return spreadsheet.worksheet(title)
+    with METRICS.timed('sheets.append_row'): ws.append_row(HEADERS)
+    return ws
+
+def archive_old_data(live, archive, mode, cutoff, index=None):
+    """Move para a planilha de arquivo tudo que é anterior a `cutoff` (date).
+
+    Com partições, páginas inteiras são copiadas e depois apagadas da planilha
+    viva. Na sheet1 (legado, sem partição) as linhas antigas são copiadas para
+    a página 'Legado' do arquivo e removidas num único batch_update, segurando
+    o `index` da sheet1: a fila apaga por número de linha e eles mudam aqui.
+    Retorna quantas páginas/linhas foram movidas.
+    """
+    moved = 0
+    for ws in live.worksheets():
+        end = partition_end(ws.title, mode) if mode else None
+        if end is None or end >= cutoff: continue
+        values = ws.get_all_values()
+        if values[1:]: open_partition(archive, ws.title).append_rows(values[1:])
+        live.del_worksheet(ws)
+        moved += 1
+
+    sheet1 = live.sheet1
+    with index.lock if index else contextlib.nullcontext():
+        values = sheet1.get_all_values()
+        if len(values) < 2 or partition_end(sheet1.title, mode): return moved
+        data_col = next((i for i, h in enumerate(values[0]) if h == 'Data'), 6)
+        old = []
+        for row_num, row in enumerate(values[1:], start=2):
+            try: day = datetime.strptime(row[data_col].strip(), "%d/%m/%Y").date()
+            except (IndexError, ValueError): continue
+            if day < cutoff: old.append(row_num)
+        if old:
+            open_partition(archive, "Legado").append_rows([values[r - 1] for r in old])
+            live.batch_update({"requests": delete_rows_requests(sheet1.id, sorted(old, reverse=True))})
+            moved += len(old)
+            if index and index.header: index.refresh(sheet1)
+    return moved
+
+class Archiver:
+    """Thread que de tempos em tempos leva os dados antigos para o arquivo.
+
+    A primeira passada espera `first_delay` s, como no HistoryExporter: um
+    reinício no meio da festa não faz logo de cara uma leitura completa.
+    """
+
+    def __init__(self, get_live, get_archive, mode, keep_days, interval=6 * 3600, first_delay=15 * 60, index=None):
+        self._get_live, self._get_archive = get_live, get_archive
+        self.mode, self.keep_days, self.interval = mode, keep_days, interval
+        self.first_delay, self.index = first_delay, index
+        self.last_run = None
+        self.last_moved = 0
+        self.last_error = None
+        threading.Thread(target=self._run, name="buffet-archiver", daemon=True).start()
+
+    def run_once(self, today):
+        live, archive = self._get_live(), self._get_archive()
+        if live is None or archive is None: return 0
+        with METRICS.timed('archive.run'):
+            self.last_moved = archive_old_data(live, archive, self.mode, today - timedelta(days=self.keep_days), self.index)
+        self.last_run = datetime.now()
+        return self.last_moved
+
+    def _run(self):
+        time.sleep(self.first_delay)
+        while True:
+            try: self.run_once(datetime.now().date())
+            except Exception as e: self.last_error = e
+            time.sleep(self.interval)
+
+# ==========================================
+# 9. MÉTRICAS (LATÊNCIA, ERROS, COTA)
+# ==========================================
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metrics:
+    """Histogramas de latência e contadores do processo, sem dependências.
+
+    Cada operação tem um histograma de faixas fixas (LATENCY_BUCKETS, em
+    segundos), contagem de erros e de cota estourada (429). `gauge` registra
+    uma função lida na hora da exportação (ex.: tamanho da fila).
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self._hist = {}   # operação -> [contagem por faixa (+ a de +Inf), soma, máximo]
+        self._errors = collections.Counter()
+        self._quota = collections.Counter()
+        self._counters = collections.Counter()
+        self._gauges = {}
+        self._recording = set()
+
+    def observe(self, op, seconds):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            h = self._hist.get(op)
+            if h is None: h = self._hist[op] = [[0] * (len(self.buckets) + 1), 0.0, 0.0]
+            h[0][i] += 1
+            h[1] += seconds
+            h[2] = max(h[2], seconds)
+
+    def error(self, op, exc):
+        with self.lock:
+            self._errors[op] += 1
+            if status_of(exc) == 429: self._quota[op] += 1
+
+    def count(self, name, n=1):
+        with self.lock: self._counters[name] += n
+
+    def gauge(self, name, read):
+        self._gauges[name] = read
+
+    @contextlib.contextmanager
+    def timed(self, op, expected=()):
+        """Mede o bloco; exceções (fora as `expected`) são contadas e seguem para quem chamou"""
+        start = time.perf_counter()
+        try: yield
+        except expected: raise
+        except Exception as e:
+            self.error(op, e)
+            raise
+        finally: self.observe(op, time.perf_counter() - start)
+
+    def _quantile(self, counts, q, worst):
+        """Limite superior da faixa onde cai o quantil, nunca acima do máximo visto"""
+        acc = 0
+        for i, c in enumerate(counts):
+            acc += c
+            if acc >= q * sum(counts): return min(self.buckets[i], worst) if i < len(self.buckets) else worst
+
+    def _read_gauges(self):
+        out = {}
+        for name, read in list(self._gauges.items()):
+            try: out[name] = read()
+            except Exception: out[name] = None
+        return out
+
+    def snapshot(self):
+        """Tudo como dicionário (o que vai para o painel e para o JSONL)"""
+        with self.lock:
+            hist = {op: (list(h[0]), h[1], h[2]) for op, h in self._hist.items()}
+            errors, quota, counters = dict(self._errors), dict(self._quota), dict(self._counters)
+        ops = {}
+        for op in sorted(set(hist) | set(errors)):
+            counts, total, worst = hist.get(op, ([0] * (len(self.buckets) + 1), 0.0, 0.0))
+            n = sum(counts)
+            ops[op] = {'count': n, 'errors': errors.get(op, 0), 'quota_429': quota.get(op, 0),
+                       'mean_ms': round(1000 * total / n, 1) if n else None, 'max_ms': round(1000 * worst, 1)}
+            for q in (50, 95, 99):
+                ops[op][f'p{q}_ms'] = round(1000 * self._quantile(counts, q / 100, worst), 1) if n else None
+        return {'ts': datetime.now().isoformat(timespec='seconds'), 'ops': ops,
+                'counters': counters, 'gauges': self._read_gauges()}
+
+    def prometheus_text(self):
+        """Formato de exposição em texto do Prometheus"""
+        with self.lock:
+            hist = {op: (list(h[0]), h[1]) for op, h in self._hist.items()}
+            errors, quota, counters = dict(self._errors), dict(self._quota), dict(self._counters)
+        lines = ["# HELP buffet_op_duration_seconds Duração das operações (Sheets, fila, tela).",
+                 "# TYPE buffet_op_duration_seconds histogram"]
+        for op in sorted(hist):
+            counts, total = hist[op]
+            acc = 0
+            for le, c in zip([*map(str, self.buckets), "+Inf"], counts):
+                acc += c
+                lines.append(f'buffet_op_duration_seconds_bucket{{op="{op}",le="{le}"}} {acc}')
+            lines.append(f'buffet_op_duration_seconds_sum{{op="{op}"}} {total:.6f}')
+            lines.append(f'buffet_op_duration_seconds_count{{op="{op}"}} {acc}')
+        for name, values, help_text in (("buffet_op_errors_total", errors, "Operações que falharam."),
+                                        ("buffet_op_quota_total", quota, "Respostas 429 (cota do Google estourada).")):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f'{name}{{op="{op}"}} {values[op]}' for op in sorted(values)]
+        for name in sorted(counters):
+            metric = "buffet_" + re.sub(r'\W', '_', name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {counters[name]}"]
+        for name, value in sorted(self._read_gauges().items()):
+            if value is None: continue
+            metric = "buffet_" + re.sub(r'\W', '_', name)
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def jsonl_line(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False)
+
+    def record_to(self, path, interval=60):
+        """Acrescenta um snapshot por linha em `path` a cada `interval` segundos (uma thread por arquivo)"""
+        with self.lock:
+            if path in self._recording: return
+            self._recording.add(path)
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    with open(path, "a", encoding="utf-8") as f: f.write(self.jsonl_line() + "\n")
+                except OSError: pass
+        threading.Thread(target=run, name="buffet-metrics", daemon=True).start()
+
+METRICS = Metrics()
+
+# ==========================================
+# 10. POOL DE CONEXÕES (VÁRIOS SALÕES)
+# ==========================================
+
+STALE_STATUS = {403, 404} # Planilha/página apagada (ex.: pelo Archiver) ou sem compartilhamento
+
+class SheetsPool:
+    """Um cliente gspread autorizado por processo e as planilhas/páginas abertas de cada salão.
+
+    Nada que falhou fica guardado: a próxima chamada tenta de novo (depois de
+    `retry_after` s, para um rerun sem rede não esperar o timeout toda vez).
+    Uma thread renova o token `refresh_margin` s antes de vencer, então
+    ninguém na portaria espera o handshake com o Google.
+    """
+
+    def __init__(self, authorize, refresh_margin=300, check_every=60, retry_after=5.0):
+        self._authorize = authorize   # () -> (cliente, credenciais)
+        self.refresh_margin, self.retry_after = refresh_margin, retry_after
+        self.lock = threading.Lock()
+        self._creds = None
+        self._cache = {}       # 'client' | nome | (nome, título) -> objeto aberto
+        self._key_locks = {}
+        self._failed_at = {}
+        self.refreshes = 0
+        self.last_error = None
+        threading.Thread(target=self._keep_fresh, args=(check_every,), name="buffet-sheets-pool", daemon=True).start()
+
+    def _get(self, key, open_fn):
+        """Do cache ou abrindo agora (uma abertura por chave de cada vez); falha devolve None"""
+        value = self._cache.get(key)
+        if value is not None: return value
+        with self.lock: key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            value = self._cache.get(key)
+            if value is not None: return value
+            failed = self._failed_at.get(key)
+            if failed is not None and time.monotonic() - failed < self.retry_after: return None
+            try: value = open_fn()
+            except Exception as e:
+                self._failed_at[key], self.last_error = time.monotonic(), e
+                return None
+            if value is not None:
+                with self.lock: self._cache[key] = value
+                self._failed_at.pop(key, None)
+            return value
+
+    def _login(self):
+        with METRICS.timed('sheets.authorize'): client, self._creds = self._authorize()
+        return client
+
+    def client(self):
+        return self._get('client', self._login)
+
+    def spreadsheet(self, name):
+        client = self.client()
+        if client is None: return None
+        def open_book():
+            with METRICS.timed('sheets.open'): return client.open(name)
+        return self._get(name, open_book)
+
+    def worksheet(self, name, title, opener):
+        """Página `title` da planilha `name`; `opener(planilha, título)` abre (ou cria) na primeira vez"""
+        book = self.spreadsheet(name)
+        if book is None: return None
+        return self._get((name, title), lambda: opener(book, title))
+
+    def forget(self, name):
+        """Esquece a planilha e as páginas dela (ex.: foi apagada ou perdeu o compartilhamento)"""
+        with self.lock:
+            for key in [k for k in self._cache if k == name or (isinstance(k, tuple) and k[0] == name)]:
+                del self._cache[key]
+
+    def failed(self, name, exc):
+        """Quem usou um objeto do pool e recebeu erro avisa aqui; 403/404 = o objeto não vale mais"""
+        if status_of(exc) in STALE_STATUS or isinstance(exc, WorksheetNotFound):
+            self.forget(name)
+            return True
+        return False
+
+    def _needs_refresh(self, creds):
+        if not getattr(creds, 'valid', True): return True
+        expiry = getattr(creds, 'expiry', None)   # UTC sem fuso, como no google-auth
+        return expiry is not None and (expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds() < self.refresh_margin
+
+    def refresh_token(self):
+        creds = self._creds
+        if creds is None or not self._needs_refresh(creds): return False
+        from google.auth.transport.requests import Request
+        with METRICS.timed('sheets.token_refresh'): creds.refresh(Request())
+        self.refreshes += 1
+        return True
+
+    def _keep_fresh(self, every):
+        while True:
+            time.sleep(every)
+            try: self.refresh_token()
+            except Exception as e: self.last_error = e
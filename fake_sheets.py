@@ -0,0 +1,192 @@
+import collections
+import random
+import re
+import threading
+import time
+import types
+
+from buffet_core import WorksheetNotFound
+
+# ==========================================
+# PLANILHA FALSA (EM MEMÓRIA) PARA BENCHMARK E TESTE LOCAL
+# ==========================================
+# Imita a parte do gspread que o app usa (Worksheet, Spreadsheet, Client),
+# com latência, cota por minuto e falhas configuráveis. Nada vai para a rede.
+
+class FakeAPIError(Exception):
+    """Erro no formato que o app entende (exc.response.status_code, como o APIError do gspread)"""
+
+    def __init__(self, status, message=""):
+        super().__init__(f"{status} {message}".strip())
+        self.response = types.SimpleNamespace(status_code=status)
+
+class FakeBackend:
+    """Configuração e contagem de chamadas compartilhadas por todas as páginas.
+
+    - `latency` (+ até `jitter`) segundos de espera em cada chamada;
+    - `quota_per_minute`: passou disso numa janela de 60 s, responde 429;
+    - `fail_rate`: chance de cada chamada falhar com `fail_status`;
+    - `fail_next(n, status)`: as próximas n chamadas falham.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, quota_per_minute=None, fail_rate=0.0, fail_status=503, seed=None, sleep=time.sleep):
+        self.latency, self.jitter = latency, jitter
+        self.quota_per_minute = quota_per_minute
+        self.fail_rate, self.fail_status = fail_rate, fail_status
+        self.sleep = sleep
+        self.calls = collections.Counter()
+        self.errors = collections.Counter()
+        self._window = collections.deque()
+        self._forced = collections.deque()
+        self._rand = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def fail_next(self, n=1, status=503):
+        with self.lock: self._forced.extend([status] * n)
+
+    def call(self, op):
+        """Cobra uma chamada: espera a latência e decide se falha"""
+        with self.lock:
+            self.calls[op] += 1
+            wait = self.latency + (self._rand.uniform(0, self.jitter) if self.jitter else 0)
+            status = self._forced.popleft() if self._forced else None
+            if status is None and self.quota_per_minute:
+                now = time.monotonic()
+                while self._window and now - self._window[0] >= 60: self._window.popleft()
+                if len(self._window) >= self.quota_per_minute: status = 429
+                else: self._window.append(now)
+            if status is None and self.fail_rate and self._rand.random() < self.fail_rate: status = self.fail_status
+            if status: self.errors[status] += 1
+        if wait: self.sleep(wait)
+        if status: raise FakeAPIError(status, f"falha simulada em {op}")
+
+class FakeCell:
+    def __init__(self, row, col, value):
+        self.row, self.col, self.value = row, col, value
+
+_A1 = re.compile(r"([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+
+class FakeWorksheet:
+    """Uma página: lista de linhas (a linha 1 é o cabeçalho, como na planilha)"""
+
+    _ids = iter(range(1, 1 << 31))
+
+    def __init__(self, backend, spreadsheet=None, title="Página1", rows=None):
+        self.backend = backend
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = next(self._ids)
+        self.rows = [[str(v) for v in r] for r in rows or []]
+
+    def _range(self, a1):
+        m = _A1.match(a1.rsplit('!', 1)[-1])
+        if not m: raise FakeAPIError(400, f"intervalo inválido: {a1}")
+        first = int(m.group(2) or 1)
+        last = int(m.group(4)) if m.group(4) else (first if m.group(3) is None and m.group(2) else len(self.rows))
+        return [list(r) for r in self.rows[first - 1:last]]
+
+    def get_all_values(self):
+        self.backend.call('get_all_values')
+        return [list(r) for r in self.rows]
+
+    def get_all_records(self):
+        self.backend.call('get_all_records')
+        if not self.rows: return []
+        header = self.rows[0]
+        return [dict(zip(header, r + [''] * (len(header) - len(r)))) for r in self.rows[1:]]
+
+    def row_values(self, row):
+        self.backend.call('row_values')
+        return list(self.rows[row - 1]) if 0 < row <= len(self.rows) else []
+
+    def batch_get(self, ranges, **kwargs):
+        self.backend.call('batch_get')
+        return [self._range(r) for r in ranges]
+
+    def get(self, range_name, **kwargs):
+        self.backend.call('get')
+        return self._range(range_name)
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        self.backend.call('append_rows')
+        start = len(self.rows) + 1
+        self.rows.extend([str(v) for v in r] for r in values)
+        return {'updates': {'updatedRange': f"{self.title}!A{start}:H{len(self.rows)}", 'updatedRows': len(values)}}
+
+    def find(self, query, in_row=None, in_column=None, **kwargs):
+        self.backend.call('find')
+        for r, row in enumerate(self.rows, start=1):
+            if in_row and r != in_row: continue
+            for c, value in enumerate(row, start=1):
+                if in_column and c != in_column: continue
+                if value == str(query): return FakeCell(r, c, value)
+        return None
+
+    def delete_rows(self, start_index, end_index=None):
+        self.backend.call('delete_rows')
+        del self.rows[start_index - 1:end_index or start_index]
+
+class FakeSpreadsheet:
+    def __init__(self, backend, title="Controle_Buffet"):
+        self.backend = backend
+        self.title = title
+        self.sheet1 = FakeWorksheet(backend, self, "Página1")
+        self._pages = [self.sheet1]
+
+    def worksheets(self):
+        self.backend.call('worksheets')
+        return list(self._pages)
+
+    def worksheet(self, title):
+        self.backend.call('worksheet')
+        for ws in self._pages:
+            if ws.title == title: return ws
+        raise WorksheetNotFound(title)
+
+    def add_worksheet(self, title, rows=1000, cols=26, **kwargs):
+        self.backend.call('add_worksheet')
+        if any(ws.title == title for ws in self._pages): raise FakeAPIError(400, f"'{title}' já existe")
+        ws = FakeWorksheet(self.backend, self, title)
+        self._pages.append(ws)
+        return ws
+
+    def del_worksheet(self, worksheet):
+        self.backend.call('del_worksheet')
+        self._pages.remove(worksheet)
+
+    def batch_update(self, body):
+        """Só entende deleteDimension de linhas (o único pedido que o app manda)"""
+        self.backend.call('batch_update')
+        for req in body.get('requests', []):
+            rng = req['deleteDimension']['range']
+            ws = next(w for w in self._pages if w.id == rng['sheetId'])
+            del ws.rows[rng['startIndex']:rng['endIndex']]
+        return {'replies': [{} for _ in body.get('requests', [])]}
+
+class FakeClient:
+    """Abre (criando na primeira vez) planilhas pelo nome, como o gspread.Client"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or FakeBackend()
+        self.books = {}
+        self.timeout = None
+
+    def set_timeout(self, timeout=None):
+        self.timeout = timeout
+
+    def open(self, title):
+        self.backend.call('open')
+        if title not in self.books: self.books[title] = FakeSpreadsheet(self.backend, title)
+        return self.books[title]
+
+def install(client=None):
+    """Faz o gspread do processo conectar no cliente falso (para rodar o app sem Google)"""
+    import gspread
+    from google.oauth2 import service_account
+    client = client or FakeClient()
+    gspread.authorize = lambda credentials, **kwargs: client
+    service_account.Credentials.from_service_account_info = classmethod(lambda cls, info, **kwargs: types.SimpleNamespace(valid=True, expiry=None))
+    return client
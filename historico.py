@@ -0,0 +1,292 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from buffet_core import HEADERS, LAST_COL, METRICS, partition_end
+
+# ==========================================
+# HISTÓRICO COLUNAR (PARQUET POR MÊS)
+# ==========================================
+# A planilha vira dois conjuntos Parquet particionados por mês:
+#   historico/convidados/mes=AAAA-MM/<origem>-<n>.parquet   (uma linha por convidado)
+#   historico/eventos/mes=AAAA-MM/<origem>-<n>.parquet      (marcador SYSTEM_START: limite do contrato)
+# Cada página da planilha é uma "origem". A exportação só acrescenta o que é
+# novo em cada origem; se a página mudou no meio (exclusão), a origem é
+# reescrita. Páginas de partição já fechadas e exportadas nem são lidas, e
+# num mês encerrado as partes delas são juntadas num único arquivo.
+
+GUEST_SCHEMA = pa.schema([
+    ("id", pa.string()), ("nome", pa.string()), ("tipo", pa.string()), ("idade", pa.int16()),
+    ("status", pa.string()), ("pagante", pa.bool_()), ("cortesia", pa.bool_()), ("crianca", pa.bool_()),
+    ("chegada", pa.timestamp("s")), ("data", pa.date32()), ("evento", pa.string()), ("evento_key", pa.string()),
+    ("origem", pa.string()),
+])
+EVENT_SCHEMA = pa.schema([
+    ("data", pa.date32()), ("evento", pa.string()), ("evento_key", pa.string()), ("limite", pa.int32()),
+    ("aberto", pa.timestamp("s")), ("origem", pa.string()),
+])
+STATE_FILE = "_estado.json"
+_AGE = re.compile(r"(\d+)")
+_UNSAFE = re.compile(r"[^0-9A-Za-z_.-]+")
+
+def _day(value):
+    try: return datetime.strptime(str(value).strip(), "%d/%m/%Y").date()
+    except ValueError: return None
+
+def _arrival(day, hora):
+    try: h, m = int(hora[:2]), int(hora[3:5])
+    except (TypeError, ValueError): return None
+    if not (0 <= h < 24 and 0 <= m < 60): return None
+    return datetime(day.year, day.month, day.day, h, m)
+
+def _age(value):
+    m = _AGE.search(str(value))
+    return min(int(m.group(1)), 32767) if m else None
+
+def rows_to_tables(rows, header, origem):
+    """Linhas cruas da planilha -> {mês: (convidados, eventos)} já tipados"""
+    col = {h: i for i, h in enumerate(header)}
+    get = lambda row, name: row[col[name]] if name in col and col[name] < len(row) else ''
+    months = {}
+    for row in rows:
+        day = _day(get(row, 'Data'))
+        if day is None: continue
+        guests, events = months.setdefault(day.strftime("%Y-%m"), ([], []))
+        status, evento = get(row, 'Status'), str(get(row, 'Evento')).strip()
+        if status == "SYSTEM_START":
+            events.append({"data": day, "evento": evento, "evento_key": evento.lower(), "limite": _age(get(row, 'Idade')),
+                           "aberto": _arrival(day, get(row, 'Hora')), "origem": origem})
+            continue
+        tipo = get(row, 'Tipo')
+        guests.append({"id": get(row, 'id'), "nome": get(row, 'Nome'), "tipo": tipo, "idade": _age(get(row, 'Idade')),
+                       "status": status, "pagante": status == "Pagante", "cortesia": tipo == "Cortesia",
+                       "crianca": tipo == "Criança", "chegada": _arrival(day, get(row, 'Hora')), "data": day,
+                       "evento": evento, "evento_key": evento.lower(), "origem": origem})
+    return {mes: (pa.Table.from_pylist(g, GUEST_SCHEMA), pa.Table.from_pylist(e, EVENT_SCHEMA)) for mes, (g, e) in months.items()}
+
+# ==========================================
+# EXPORTAÇÃO INCREMENTAL
+# ==========================================
+
+class HistoryStore:
+    """Pasta do histórico e o estado da exportação (o que já foi gravado de cada origem)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        try:
+            with open(os.path.join(path, STATE_FILE), encoding="utf-8") as f: self.state = json.load(f)
+        except (OSError, ValueError): self.state = {}
+
+    def _save_state(self):
+        tmp = os.path.join(self.path, STATE_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.path, STATE_FILE))
+
+    def _write(self, key, src, rows, header):
+        """Grava as linhas como novas partes da origem; devolve os arquivos criados"""
+        files = []
+        for mes, tables in rows_to_tables(rows, header, key).items():
+            for kind, table in zip(("convidados", "eventos"), tables):
+                if not table.num_rows: continue
+                folder = os.path.join(self.path, kind, f"mes={mes}")
+                os.makedirs(folder, exist_ok=True)
+                src['seq'] = src.get('seq', 0) + 1
+                name = os.path.join(folder, f"{_UNSAFE.sub('_', key)}-{src['seq']:05d}.parquet")
+                pq.write_table(table, name)
+                files.append(os.path.relpath(name, self.path))
+        return files
+
+    def export_page(self, key, values):
+        """Acrescenta o que é novo nesta página (ou reescreve a origem se ela mudou). Retorna linhas gravadas."""
+        if not values: return 0
+        header, data = values[0], values[1:]
+        with self.lock:
+            src = self.state.get(key) or {"rows": 0, "last": None, "files": []}
+            done = src["rows"]
+            if len(data) >= done and (done == 0 or "\x1f".join(data[done - 1]) == src["last"]):
+                new = data[done:]
+            else:
+                # Linhas sumiram ou mudaram no meio: a origem é gravada de novo
+                for rel in src["files"]:
+                    try: os.remove(os.path.join(self.path, rel))
+                    except OSError: pass
+                src["files"], new = [], data
+            if not new and key in self.state: return 0
+            src["files"] += self._write(key, src, new, header)
+            src["rows"], src["last"] = len(data), "\x1f".join(data[-1]) if data else None
+            src["exported_at"] = datetime.now().isoformat(timespec='seconds')
+            self.state[key] = src
+            self._save_state()
+            return len(new)
+
+    def compact(self, mode, today):
+        """Junta num arquivo por mês/tipo as partes das páginas de partição de meses encerrados.
+
+        As partes da sheet1/Legado ficam de fora: essas origens ainda podem
+        ser reescritas. Retorna quantos arquivos foram juntados.
+        """
+        merged = 0
+        with self.lock:
+            owner = {rel: key for key, src in self.state.items() for rel in src["files"]}
+            closed = {key for key in self.state if mode and partition_end(key, mode)}
+            for kind, schema in (("convidados", GUEST_SCHEMA), ("eventos", EVENT_SCHEMA)):
+                root = os.path.join(self.path, kind)
+                if not os.path.isdir(root): continue
+                for folder in sorted(os.listdir(root)):
+                    try: first = datetime.strptime(folder, "mes=%Y-%m").date()
+                    except ValueError: continue
+                    if partition_end(first.strftime("%Y-%m"), 'mes') >= today - timedelta(days=1): continue
+                    rels = [os.path.join(kind, folder, f) for f in sorted(os.listdir(os.path.join(root, folder))) if f.endswith(".parquet")]
+                    parts = [r for r in rels if owner.get(r) in closed or os.path.basename(r).startswith("compactado")]
+                    if len(parts) < 2: continue
+                    table = pa.concat_tables(pq.read_table(os.path.join(self.path, r), schema=schema) for r in parts)
+                    target = os.path.join(kind, folder, f"compactado-{int(time.time() * 1000)}.parquet")
+                    pq.write_table(table, os.path.join(self.path, target))
+                    for r in parts:
+                        os.remove(os.path.join(self.path, r))
+                        if r in owner: self.state[owner[r]]["files"].remove(r)
+                    merged += len(parts)
+            if merged: self._save_state()
+        return merged
+
+    def unchanged(self, key, ws):
+        """Página já exportada que continua igual: uma leitura pequena (última linha exportada e a
+        seguinte) evita o get_all_values. Exclusões mudam a última linha; edição no meio não é vista."""
+        src = self.state.get(key)
+        if not src or not src["rows"] or src["last"] is None: return False
+        n = src["rows"] + 1 # + cabeçalho
+        with METRICS.timed('sheets.batch_get'): anchor, after = ws.batch_get([f"A{n}:{LAST_COL}{n}", f"A{n + 1}:{LAST_COL}{n + 1}"])
+        return bool(anchor) and not after and _cells(anchor[0]) == _cells(src["last"].split("\x1f"))
+
+    def is_closed(self, key, mode, today):
+        """Página de partição que já terminou (antes de ontem) e já foi exportada: não precisa ler"""
+        end = partition_end(key, mode) if mode else None
+        return end is not None and end < today - timedelta(days=1) and key in self.state
+
+def _cells(row):
+    """Colunas do app sem as células vazias do fim (a API as omite)"""
+    row = [str(v) for v in row[:len(HEADERS)]]
+    while row and not row[-1]: row.pop()
+    return row
+
+def source_key(book, ws, mode):
+    """Páginas de partição mudam de planilha ao serem arquivadas: a chave é só o título"""
+    if mode and partition_end(ws.title, mode): return ws.title
+    return f"{book.title}/{ws.title}"
+
+def export_history(store, books, mode, today=None, pause=0.0):
+    """Passa por todas as páginas das planilhas (viva e arquivo). Retorna linhas gravadas.
+
+    Cada página custa leituras da mesma cota das portarias: as fechadas e as
+    que não mudaram nem são lidas inteiras, e entre uma página e outra
+    espera `pause` s.
+    """
+    today = today or date.today()
+    written = 0
+    for book in books:
+        if book is None: continue
+        with METRICS.timed('sheets.worksheets'): pages = book.worksheets()
+        for ws in pages:
+            key = source_key(book, ws, mode)
+            if store.is_closed(key, mode, today): continue
+            if pause: time.sleep(pause)
+            if store.unchanged(key, ws): continue
+            with METRICS.timed('sheets.get_all_values'): values = ws.get_all_values()
+            if values and values[0][:len(HEADERS)] != HEADERS and 'Data' not in values[0]: continue
+            written += store.export_page(key, values)
+    return written
+
+class HistoryExporter:
+    """Thread que de tempos em tempos compacta a planilha no histórico.
+
+    A primeira passada espera `first_delay` s: um reinício no meio da festa
+    não gasta a cota de leitura das portarias logo de cara.
+    """
+
+    def __init__(self, store, get_books, mode, interval=6 * 3600, first_delay=15 * 60, pause=1.0):
+        self.store, self._get_books = store, get_books
+        self.mode, self.interval = mode, interval
+        self.first_delay, self.pause = first_delay, pause
+        self.last_run = None
+        self.last_written = 0
+        self.last_error = None
+        self._run_lock = threading.Lock()
+        threading.Thread(target=self._run, name="buffet-history", daemon=True).start()
+
+    def run_once(self):
+        with self._run_lock, METRICS.timed('history.export'):
+            self.last_written = export_history(self.store, self._get_books(), self.mode, pause=self.pause)
+            self.store.compact(self.mode, date.today())
+            self.last_run = datetime.now()
+            return self.last_written
+
+    def _run(self):
+        time.sleep(self.first_delay)
+        while True:
+            try: self.run_once()
+            except Exception as e: self.last_error = e
+            time.sleep(self.interval)
+
+# ==========================================
+# ANÁLISES (VETORIZADAS)
+# ==========================================
+
+WEEKDAYS = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+
+def _dataset(path, kind, schema):
+    folder = os.path.join(path, kind)
+    if not os.path.isdir(folder): return schema.empty_table()
+    return ds.dataset(folder, schema=schema, format="parquet", partitioning=None).to_table()
+
+def _party_days(guests, events):
+    """Data de cada convidado trocada pela da festa: quem chegou depois da meia-noite grava o dia
+    seguinte, mas conta na festa aberta na véspera (se não houver festa com o mesmo nome no dia)"""
+    days = lambda col: pc.cast(col, pa.int32())
+    opened = pa.table({"d": days(events["data"]), "evento_key": events["evento_key"]}).group_by(["d", "evento_key"]).aggregate([])
+    eve = pa.table({"d": pc.cast(pc.add(opened["d"], 1), pa.int32()), "evento_key": opened["evento_key"], "festa": opened["d"]})
+    same = opened.append_column("aberta", pa.array([True] * opened.num_rows, pa.bool_()))
+    out = guests.append_column("d", days(guests["data"])).join(eve, ["d", "evento_key"], join_type="left outer")
+    out = out.join(same, ["d", "evento_key"], join_type="left outer")
+    moved = pc.and_(pc.is_valid(out["festa"]), pc.is_null(out["aberta"]))
+    data = pc.cast(pc.if_else(moved, out["festa"], out["d"]), pa.date32())
+    return out.set_column(out.schema.get_field_index("data"), "data", data).drop_columns(["d", "festa", "aberta"])
+
+def event_summary(path):
+    """Um registro por evento: pagantes, isentos, cortesias, crianças, limite e se passou do limite"""
+    events = _dataset(path, "eventos", EVENT_SCHEMA)
+    guests = _dataset(path, "convidados", GUEST_SCHEMA).select(["data", "evento_key", "pagante", "cortesia", "crianca", "chegada"])
+    guests = _party_days(guests, events)
+    as_int = lambda name: pc.cast(guests[name], pa.int32())
+    counted = pa.table({"data": guests["data"], "evento_key": guests["evento_key"], "pagantes": as_int("pagante"),
+                        "cortesias": as_int("cortesia"), "criancas": as_int("crianca"), "chegada": guests["chegada"]})
+    per_event = counted.group_by(["data", "evento_key"]).aggregate([
+        ("pagantes", "count"), ("pagantes", "sum"), ("cortesias", "sum"), ("criancas", "sum"),
+        ("chegada", "min"), ("chegada", "max")]).rename_columns(
+        ["data", "evento_key", "total", "pagantes", "cortesias", "criancas", "primeira", "ultima"])
+    # Como no app: vale o marcador mais novo (festa recriada com outro limite)
+    opened_at = pc.fill_null(events["aberto"], pa.scalar(datetime(1970, 1, 1), pa.timestamp("s")))
+    latest = events.take(pc.sort_indices(opened_at))
+    limits = latest.group_by(["data", "evento_key"], use_threads=False).aggregate([("evento", "last"), ("limite", "last")]).rename_columns(
+        ["data", "evento_key", "evento", "limite"])
+    out = per_event.join(limits, ["data", "evento_key"], join_type="left outer")
+    isentos = pc.subtract(pc.subtract(out["total"], pc.cast(out["pagantes"], pa.int64())), pc.cast(out["cortesias"], pa.int64()))
+    out = out.append_column("isentos", isentos)
+    out = out.append_column("dia_semana", pc.day_of_week(pc.cast(out["data"], pa.timestamp("s"))))
+    return out.append_column("passou_limite", pc.fill_null(pc.greater(out["pagantes"], out["limite"]), False))
+
+def weekday_summary(events):
+    """Por dia da semana: quantos eventos, média de pagantes e quantas vezes passou do limite"""
+    out = events.group_by("dia_semana").aggregate([
+        ("pagantes", "count"), ("pagantes", "mean"), ("total", "mean"), ("passou_limite", "sum")]).rename_columns(
+        ["dia_semana", "eventos", "media_pagantes", "media_total", "passou_limite"])
+    return out.sort_by("dia_semana")
@@ -1,14 +1,16 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime
-from fpdf import FPDF
+from datetime import datetime, timedelta
 import requests
+import io
 import os
-import plotly.express as px
 import pytz
+import threading
 import time
-import re
-import concurrent.futures # Para rodar em segundo plano
+from buffet_core import (SheetIndex, WriteQueue, LocalJournal, EventStore, PageWatcher, GuestParser, GuestListIndex, Archiver, SheetsPool, CORTESIA_WORDS,
+                         HEADERS, METRICS, PDF_COLUMNS, build_report_pdf, dup_key, find_duplicate_groups, guest_list_entries, guest_list_text,
+                         next_day, open_partition, partition_title, party_date)
+
+RERUN_START = time.perf_counter()
 
 # ==========================================
 # CONFIGURAÇÃO INICIAL
@@ -19,7 +21,18 @@ st.set_page_config(page_title="Controle de Buffet", page_icon="🟣", layout="wi
 LOGO_URL = "https://lanbele.com.br/wp-content/uploads/2025/09/IMG-20250920-WA0029-1024x585.png"
 LOGO_PATH = "logo_cache.png"
 SENHA_ADMIN = "1234"
-SHEET_NAME = "Controle_Buffet"
+SHEET_NAME = "Controle_Buffet" # Salão padrão; outros salões vêm de [locais] nos secrets ("Salão" = "Planilha")
+PARTICAO = None # "dia" ou "mes": uma página por período (ligue num dia sem festa: a sheet1 deixa de ser lida); None = tudo na sheet1
+ARQUIVO_SHEET_NAME = "Controle_Buffet_Arquivo" # Planilha de histórico (compartilhe com a conta de serviço); outros salões: "<planilha>_Arquivo"
+ARQUIVO_APOS_DIAS = 30 # Dados mais antigos que isso saem da planilha do dia a dia
+HISTORICO_DIR = "historico" # Histórico em Parquet (um arquivo por mês) para as análises; None = desliga
+JOURNAL_PATH = "buffet_journal.db" # Diário local (fonte primária, sincroniza com a planilha)
+IDADE_ISENTO = 7 # Crianças até esta idade não pagam
+PALAVRAS_CORTESIA = CORTESIA_WORDS # Parentes e equipe que entram como cortesia
+SHEETS_TIMEOUT_S = 10 # Sem resposta do Google nesse tempo, a chamada desiste (rede do salão caiu)
+AUTO_REFRESH_MIN_S = 3 # Com chegadas, olha cada página da planilha a cada 3 s...
+AUTO_REFRESH_MAX_S = 30 # ...e parado vai espaçando até 30 s (cota do Google: 60 leituras/min)
+METRICAS_JSONL = None # Ex.: "buffet_metrics.jsonl" grava um retrato das métricas por minuto (cresce sem parar: limpe de vez em quando)
 
 # Imports Condicionais (Google Sheets)
 try:
@@ -37,19 +50,89 @@ def get_brazil_time():
     return datetime.now(pytz.timezone('America/Sao_Paulo'))
 
 @st.cache_resource
-def download_logo():
-    if not os.path.exists(LOGO_PATH):
+def get_logo():
+    """Busca a logo em segundo plano (uma vez por processo); a tela usa os bytes quando chegarem"""
+    logo = {'data': None}
+    def fetch():
         try:
+            if os.path.exists(LOGO_PATH):
+                with open(LOGO_PATH, "rb") as f: logo['data'] = f.read()
+                return
             headers = {'User-Agent': 'Mozilla/5.0'}
             response = requests.get(LOGO_URL, headers=headers, timeout=5)
             if response.status_code == 200:
+                logo['data'] = response.content
                 with open(LOGO_PATH, "wb") as f: f.write(response.content)
-        except: pass
+        except Exception: pass
+    threading.Thread(target=fetch, name="buffet-logo", daemon=True).start()
+    return logo
+
+def logo_bytes():
+    return get_logo()['data']
+
+def get_venues():
+    """Salões do secrets ([locais] "Salão" = "Planilha"); sem a seção, só SHEET_NAME"""
+    try: venues = {str(k): str(v) for k, v in st.secrets.get("locais", {}).items()}
+    except Exception: venues = {} # Sem secrets.toml
+    return venues or {"Principal": SHEET_NAME}
+
+def current_book():
+    """Planilha do salão escolhido nesta sessão (tablet)"""
+    venues = get_venues()
+    return venues.get(st.session_state.get('venue'), next(iter(venues.values())))
+
+def venue_suffix(book):
+    """'' para o salão padrão (arquivos e métricas de antes continuam valendo)"""
+    if book == SHEET_NAME: return ""
+    return "_" + "".join(c if c.isalnum() else "_" for c in book).strip("_").lower()
+
+def venue_path(path, book):
+    root, ext = os.path.splitext(path)
+    return f"{root}{venue_suffix(book)}{ext}"
+
+def archive_book(book):
+    return ARQUIVO_SHEET_NAME if book == SHEET_NAME else f"{book}_Arquivo"
 
 @st.cache_resource
-def get_thread_executor():
-    """Cria um executor para salvar em segundo plano sem travar a tela"""
-    return concurrent.futures.ThreadPoolExecutor(max_workers=4)
+def get_event_store(book, event_key, day):
+    """Um único estado por Salão/Evento/Data para todas as sessões (tablets) do processo"""
+    return EventStore(event_key, day)
+
+def party_day():
+    """Dia da festa desta sessão (guardado ao entrar): passar da meia-noite não troca de evento"""
+    return st.session_state.get('day') or get_brazil_time().strftime("%d/%m/%Y")
+
+def party_days(day):
+    """O dia da festa e, depois da meia-noite, o seguinte (quem chega 00:30 grava a Data nova)"""
+    start = datetime.strptime(day, "%d/%m/%Y")
+    if get_brazil_time().replace(tzinfo=None) < start + timedelta(days=1): return [day]
+    return [day, next_day(day)]
+
+def current_store():
+    return get_event_store(current_book(), str(st.session_state.name).strip().lower(), party_day())
+
+@st.cache_resource
+def get_event_marks(book, event_key, day):
+    """Até onde o espelho de cada página já foi aplicado ao evento (título -> mark)"""
+    return {}
+
+@st.cache_resource
+def get_journal(book):
+    """Diário SQLite local do salão: cada check-in é gravado aqui antes de ir para a nuvem"""
+    return LocalJournal(venue_path(JOURNAL_PATH, book))
+
+@st.cache_resource
+def get_write_queue(book):
+    """Fila do salão que sincroniza o diário com a planilha em segundo plano"""
+    queue = WriteQueue(lambda title: get_partition_sheet(book, title), journal=get_journal(book),
+                       get_index=lambda title: get_sheet_index(book, title),
+                       partition_of=lambda day: partition_title(day, PARTICAO),
+                       on_error=lambda title, e: sheet_failed(book, e))
+    suffix = venue_suffix(book)
+    METRICS.gauge('queue_pending' + suffix, lambda: queue.pending)
+    METRICS.gauge('queue_failed' + suffix, lambda: queue.failed)
+    METRICS.gauge('queue_sent' + suffix, lambda: queue.sent)
+    return queue
 
 st.markdown("""
     <style>
@@ -87,249 +170,375 @@ st.markdown("""
 # 2. CONEXÃO OTIMIZADA (CACHEADA)
 # ==========================================
 
-@st.cache_resource(ttl=3600) # Mantém a conexão viva por 1 hora
-def get_cached_sheet_object():
-    """Conecta no Google APENAS UMA VEZ e guarda na memória"""
+@st.cache_resource
+def get_pool():
+    """Um cliente autorizado por processo e as planilhas abertas de cada salão (o token renova sozinho)"""
     if not HAS_GSHEETS: return None
     
     creds_dict = None
-    if "gcp_service_account" in st.secrets: creds_dict = dict(st.secrets["gcp_service_account"])
-    elif "gsheets" in st.secrets: creds_dict = dict(st.secrets["gsheets"])
+    try:
+        if "gcp_service_account" in st.secrets: creds_dict = dict(st.secrets["gcp_service_account"])
+        elif "gsheets" in st.secrets: creds_dict = dict(st.secrets["gsheets"])
+    except Exception: pass # Sem secrets.toml
     if not creds_dict: return None
 
-    try:
-        scope = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+    scope = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+    def authorize():
         creds = Credentials.from_service_account_info(creds_dict, scopes=scope)
         client = gspread.authorize(creds)
-        sheet = client.open(SHEET_NAME).sheet1
-        return sheet
-    except Exception: return None
+        client.set_timeout(SHEETS_TIMEOUT_S)
+        return client, creds
+    pool = SheetsPool(authorize)
+    METRICS.gauge('token_refreshes', lambda: pool.refreshes)
+    return pool
+
+def get_spreadsheet(name):
+    """Planilha aberta pelo pool; falha não fica guardada (tenta de novo em poucos segundos)"""
+    pool = get_pool()
+    return pool.spreadsheet(name) if pool else None
+
+def get_partition_sheet(book, title):
+    """Página de uma partição do salão (criada na primeira vez); None = sheet1"""
+    pool = get_pool()
+    if not pool: return None
+    return pool.worksheet(book, title, lambda sheets, t: sheets.sheet1 if t is None else open_partition(sheets, t))
+
+def sheet_failed(book, exc):
+    """Erro numa planilha/página do pool: se ela foi apagada ou perdeu o acesso, abre de novo na próxima vez"""
+    pool = get_pool()
+    if pool: pool.failed(book, exc)
+
+def current_partition():
+    return partition_title(get_brazil_time().strftime("%d/%m/%Y"), PARTICAO)
+
+def pages_of(days):
+    """Páginas (título -> datas) onde moram as linhas dessas datas"""
+    pages = {}
+    for day in days: pages.setdefault(partition_title(day, PARTICAO), []).append(day)
+    return pages.items()
+
+def get_cached_sheet_object():
+    """Página da partição de hoje no salão desta sessão: a única que a tela lê"""
+    return get_partition_sheet(current_book(), current_partition())
+
+@st.cache_resource
+def get_sheet_index(book, title):
+    """Espelho de uma página, compartilhado pelo processo (lê só o que é novo)"""
+    return SheetIndex()
+
+@st.cache_resource
+def get_page_watcher(book, title):
+    """Auto-atualização da página: uma thread e um ritmo por página, não por evento (cota de leituras do Google)"""
+    return PageWatcher(lambda: get_partition_sheet(book, title), get_sheet_index(book, title), AUTO_REFRESH_MIN_S, AUTO_REFRESH_MAX_S,
+                       on_error=lambda e: sheet_failed(book, e))
+
+@st.cache_resource
+def start_archiver(book):
+    """Move para a planilha de arquivo do salão o que passou de ARQUIVO_APOS_DIAS (a cada 6 h)"""
+    return Archiver(lambda: get_spreadsheet(book), lambda: get_spreadsheet(archive_book(book)), PARTICAO, ARQUIVO_APOS_DIAS,
+                    index=get_sheet_index(book, None))
+
+@st.cache_resource
+def start_history_exporter(book):
+    """Compacta a planilha (viva e arquivo) no histórico Parquet a cada 6 h; o pyarrow carrega fora da tela"""
+    holder = {'exporter': None}
+    def boot():
+        import historico
+        holder['exporter'] = historico.HistoryExporter(
+            historico.HistoryStore(venue_path(HISTORICO_DIR, book)),
+            lambda: [get_spreadsheet(book), get_spreadsheet(archive_book(book))], PARTICAO)
+    threading.Thread(target=boot, name="buffet-history-boot", daemon=True).start()
+    return holder
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def history_summary(path, stamp):
+    """Resumo por evento e por dia da semana; a chave é a pasta e a data do último export"""
+    import historico
+    events = historico.event_summary(path)
+    weekdays = historico.weekday_summary(events).to_pandas()
+    weekdays['dia_semana'] = [historico.WEEKDAYS[d] for d in weekdays['dia_semana']]
+    return events.sort_by([("data", "descending")]).to_pandas(), weekdays
+
+@st.cache_resource
+def get_header_checked():
+    """Páginas que já conferimos neste processo (falhas não entram, tentam de novo)"""
+    return set()
 
 def check_and_init_headers():
+    key = (current_book(), current_partition())
+    checked = get_header_checked()
+    if key in checked: return
     sheet = get_cached_sheet_object()
     if not sheet: return
     try:
         # Verifica se está vazio
-        if not sheet.row_values(1):
-            sheet.append_row(["id", "Nome", "Tipo", "Idade", "Status", "Hora", "Data", "Evento"])
-    except: pass
+        with METRICS.timed('sheets.row_values'): first = sheet.row_values(1)
+        if not first:
+            with METRICS.timed('sheets.append_row'): sheet.append_row(HEADERS)
+        checked.add(key)
+    except Exception as e: sheet_failed(key[0], e) # Contado nas métricas; tenta de novo no próximo rerun
 
 def get_active_parties_today():
-    sheet = get_cached_sheet_object()
-    if not sheet: return []
-    try:
-        data = sheet.get_all_records()
-        today = get_brazil_time().strftime("%d/%m/%Y")
-        return list({str(r.get('Evento','')).strip() for r in data if str(r.get('Data','')).strip() == today and str(r.get('Evento','')).strip()})
-    except: return []
+    """Festas de hoje e, de madrugada, as de ontem ainda em andamento: [(nome, dia da festa)]"""
+    now = get_brazil_time()
+    days = list(dict.fromkeys([party_date(now), now.strftime("%d/%m/%Y")]))
+    book = current_book()
+    journal = get_journal(book)
+    indexes = {}
+    for title, _ in pages_of(days):
+        sheet = get_partition_sheet(book, title)
+        if not sheet: continue
+        try:
+            index = get_sheet_index(book, title)
+            index.refresh(sheet)
+            indexes[title] = index
+        except Exception as e:
+            METRICS.error('app.parties', e)
+            sheet_failed(book, e)
+    # A festa é do dia mais antigo em que aparece (quem chega depois da meia-noite grava a Data nova)
+    found = {}
+    for day in days:
+        names = list(journal.events_on(day))
+        index = indexes.get(partition_title(day, PARTICAO))
+        if index: names += index.events_on(day)
+        for e in names:
+            if e and e.strip(): found.setdefault(e.strip().lower(), (e.strip(), day))
+    return list(found.values())
+
+def load_data_from_sheets(target_event, day):
+    """Serve do diário local; com conexão, antes traz o que as outras portarias gravaram"""
+    book = current_book()
+    journal = get_journal(book)
+    marks = get_event_marks(book, str(target_event).strip().lower(), day)
+    for title, days in pages_of(party_days(day)):
+        sheet = get_partition_sheet(book, title)
+        if not sheet: continue
+        try:
+            index = get_sheet_index(book, title)
+            with METRICS.timed('app.sync'):
+                with index.lock:
+                    seen_at = time.time()
+                    index.refresh(sheet)
+                    records = {d: index.records(d, target_event) for d in days}
+                    marks[title] = index.mark()
+                for d in days: journal.merge(d, target_event, records[d], seen_at)
+        except Exception as e: sheet_failed(book, e) # Contado nas métricas; segue com o diário local
+    return journal_guests(target_event, day)
+
+def guest_from_row(row, today):
+    return {
+        'id': str(row.get('id') or ''),
+        'Nome': row.get('Nome', ''),
+        'Tipo': row.get('Tipo', 'Adulto'),
+        'Idade': row.get('Idade', '-'),
+        'Status': row.get('Status', 'Pagante'),
+        'Hora': row.get('Hora', '--:--'),
+        'Data': row.get('Data') or today,
+        'Evento': row.get('Evento', ''),
+        '_is_paying': True if row.get('Status') == 'Pagante' else False
+    }
 
-def load_data_from_sheets(target_event):
-    sheet = get_cached_sheet_object()
-    if not sheet: return [], 100
-    try:
-        data = sheet.get_all_records()
-        cleaned = []
-        today = get_brazil_time().strftime("%d/%m/%Y")
-        target = str(target_event).strip().lower()
-        limit = 100 
-
-        for row in data:
-            evt = str(row.get('Evento', '')).strip().lower()
-            dt = str(row.get('Data', '')).strip()
-            
-            if evt == target and dt == today:
-                if str(row.get('Status')) == "SYSTEM_START":
-                    try: limit = int(row.get('Idade', 100))
-                    except: pass
-                    continue
-
-                cleaned.append({
-                    'id': str(row.get('id') or row.get('ID') or ''),
-                    'Nome': row.get('Nome', ''),
-                    'Tipo': row.get('Tipo', 'Adulto'),
-                    'Idade': row.get('Idade', '-'),
-                    'Status': row.get('Status', 'Pagante'),
-                    'Hora': row.get('Hora', '--:--'),
-                    'Data': dt,
-                    'Evento': row.get('Evento', ''),
-                    '_is_paying': True if row.get('Status') == 'Pagante' else False
-                })
-        return cleaned[::-1], limit
-    except: return [], 100
+def row_limit(row, default=100):
+    try: return int(row.get('Idade', default))
+    except (TypeError, ValueError): return default
+
+def journal_guests(target_event, day):
+    """Convidados vivos no diário (mais novo primeiro, inclusive os de depois da meia-noite) e o limite do contrato"""
+    cleaned = []
+    limit = 100 
+    journal = get_journal(current_book())
+    for d in party_days(day):
+        for row in journal.rows(d, target_event):
+            if str(row.get('Status')) == "SYSTEM_START":
+                limit = row_limit(row, limit) # Vale o marcador mais novo
+                continue
+            cleaned.append(guest_from_row(row, d))
+    return cleaned[::-1], limit
+
+def apply_sheet_records(store, journal, event, found, seen_at):
+    """Leva ao diário e ao estado o que o espelho trouxe: [(data, releu tudo?, linhas)]. True se o evento mudou."""
+    new, reload = [], False
+    for day, full, records in found:
+        if full:
+            # Alguém apagou ou editou linhas: o evento volta inteiro (raro)
+            journal.merge(day, event, records, seen_at)
+            reload = True
+        elif records:
+            journal.merge(day, event, records, seen_at, tombstone=False)
+            # Nossas próprias linhas já estão no estado; as desfeitas aqui não voltam
+            gone = journal.deleted(day, event, (r.get('id') for r in records))
+            for r in records:
+                gid = str(r.get('id') or '')
+                if str(r.get('Status')) == "SYSTEM_START":
+                    limit = row_limit(r, store.limit)
+                    if limit != store.limit: store.set_limit(limit)
+                elif gid not in store and gid not in gone: new.append(guest_from_row(r, day))
+    if reload: store.load(*journal_guests(event, store.day))
+    elif new: store.add_many(new)
+    return reload or bool(new)
+
+def pull_sheet_changes():
+    """Auto-atualização: a thread da página olha a planilha (batch_get âncora + cauda); aqui, sem rede,
+    só entra no evento o que o espelho trouxe desde a última vez"""
+    store = current_store()
+    if not store.loaded: return
+    book, event = current_book(), st.session_state.name
+    journal, marks = get_journal(book), get_event_marks(book, str(event).strip().lower(), store.day)
+    for title, days in pages_of(party_days(store.day)):
+        get_page_watcher(book, title).touch()
+        index = get_sheet_index(book, title)
+        with index.lock:
+            # Espelho ainda não lido: não há o que comparar (e um evento vazio apagaria o diário)
+            if index.seen_at is None or marks.get(title) == index.mark(): continue
+            seen_at = index.seen_at
+            found = [(d, *index.records_since(marks.get(title), d, event)) for d in days]
+            marks[title] = index.mark()
+        try: apply_sheet_records(store, journal, event, found, seen_at)
+        except Exception as e: METRICS.error('app.poll', e)
 
 # FUNÇÃO DE SALVAMENTO ASSÍNCRONA
-def _save_row_bg(row_data):
-    """Função interna que roda na thread separada"""
-    sheet = get_cached_sheet_object()
-    if not sheet: return
-    try:
-        sheet.append_row([
-            str(row_data.get('id')), row_data.get('Nome'), row_data.get('Tipo'),
-            str(row_data.get('Idade')), row_data.get('Status'), row_data.get('Hora'),
-            row_data.get('Data'), row_data.get('Evento')
-        ])
-    except: pass
-
 def save_row(row_data):
-    """Dispara o salvamento e libera a tela IMEDIATAMENTE"""
-    executor = get_thread_executor()
-    executor.submit(_save_row_bg, row_data)
-    return True # Retorna True imediatamente, confiando na thread
+    """Grava no diário local (< 1 ms) e deixa a fila levar para a planilha"""
+    return save_rows([row_data])
 
-def delete_row(guest_id):
-    sheet = get_cached_sheet_object()
-    if not sheet: return False
-    try:
-        cell = sheet.find(str(guest_id))
-        if cell: 
-            sheet.delete_rows(cell.row)
-            return True
-    except: pass
-    return False
+def save_rows(rows):
+    """Várias linhas numa transação do diário e num único append_rows"""
+    get_write_queue(current_book()).put_many(rows)
+    return True # A fila agrupa, repete em caso de cota e reenvia após reinício
+
+def delete_row(guest):
+    """Registra a exclusão no diário; a fila apaga a linha pelo índice id→linha"""
+    get_write_queue(current_book()).put_delete(guest)
+    return True
 
 # ==========================================
 # 3. SMART PARSER
 # ==========================================
 
-def parse_input_text(text):
-    text = text.strip()
-    if not text: return None
-    lower_text = text.lower()
-    
-    keywords = ['mãe', 'mae', 'pai', 'irmao', 'irmão', 'irma', 'irmã', 'fotografo', 'fotógrafo', 'staff', 'baba', 'babá', 'avó', 'avô', 'cortesia']
-    words = lower_text.replace(',', ' ').replace('-', ' ').split()
-    
-    if any(k in words for k in keywords):
-        return {"Nome": text.title(), "Tipo": "Cortesia", "Idade": "-", "Status": "Cortesia", "_is_paying": False}
-
-    match = re.search(r'(\d+)', text)
-    if match:
-        age = int(match.group(1))
-        clean_name = re.sub(r'\d+\s*(anos|ano|a)?', '', text, flags=re.IGNORECASE).strip()
-        if not clean_name: clean_name = "Criança"
-        status = "Isento" if age <= 7 else "Pagante"
-        is_paying = (age > 7)
-        return {"Nome": clean_name.title(), "Tipo": "Criança", "Idade": f"{age} anos", "Status": status, "_is_paying": is_paying}
-
-    return {"Nome": text.title(), "Tipo": "Adulto", "Idade": "-", "Status": "Pagante", "_is_paying": True}
+@st.cache_resource
+def get_parser():
+    """Regras compiladas uma vez por processo"""
+    return GuestParser(free_age=IDADE_ISENTO, cortesia_words=PALAVRAS_CORTESIA)
 
 # ==========================================
 # 4. PDF
 # ==========================================
-@st.cache_data(show_spinner=False)
-def generate_pdf(party_name, guests_df, p_counts, guest_limit):
-    pdf = FPDF()
-    pdf.add_page()
-    if os.path.exists(LOGO_PATH):
-        try: pdf.image(LOGO_PATH, x=10, y=10, w=40)
-        except: pass
-
-    pdf.set_font("Helvetica", 'B', 16)
-    pdf.set_xy(55, 15)
-    pdf.set_text_color(106, 27, 154)
-    pdf.cell(0, 10, txt=f"Relatório Final: {party_name}", ln=True)
-    
-    pdf.set_xy(55, 23)
-    pdf.set_font("Helvetica", size=10)
-    pdf.set_text_color(50, 50, 50)
-    now_str = get_brazil_time().strftime('%d/%m/%Y %H:%M')
-    pdf.cell(0, 10, txt=f"Gerado em: {now_str}", ln=True)
-    pdf.ln(20)
-    
-    # Resumo
-    pdf.set_fill_color(106, 27, 154); pdf.set_text_color(255, 255, 255)
-    pdf.set_font("Helvetica", 'B', 12); pdf.cell(0, 10, "  Resumo", ln=True, fill=True)
-    pdf.set_text_color(0, 0, 0); pdf.set_font("Helvetica", size=12); pdf.ln(2)
-    
-    pdf.cell(0, 8, f"Limite Contratado: {guest_limit}", ln=True)
-    pdf.cell(0, 8, f"Total Presente: {p_counts['total']}", ln=True)
-    pdf.ln(2)
-    pdf.cell(0, 8, f"Pagantes: {p_counts['paying']}", ln=True)
-    pdf.cell(0, 8, f"Isentos (<=7): {p_counts['free']}", ln=True)
-    pdf.cell(0, 8, f"Cortesias: {p_counts['cortesia']}", ln=True)
-    pdf.ln(10)
-    
-    # Tabela
-    pdf.set_font("Helvetica", 'B', 10)
-    pdf.set_fill_color(106, 27, 154); pdf.set_text_color(255, 255, 255)
-    pdf.cell(80, 8, "Nome", 1, 0, 'L', 1); pdf.cell(30, 8, "Tipo", 1, 0, 'C', 1)
-    pdf.cell(30, 8, "Idade", 1, 0, 'C', 1); pdf.cell(30, 8, "Status", 1, 0, 'C', 1)
-    pdf.cell(20, 8, "Hora", 1, 1, 'C', 1)
-    pdf.set_text_color(0, 0, 0); pdf.set_font("Helvetica", size=10)
-    
-    fill = False
-    for index, row in guests_df.iterrows():
-        if fill: pdf.set_fill_color(240, 240, 245)
-        else: pdf.set_fill_color(255, 255, 255)
-        try:
-            vals = [str(row.get(c,'-')).encode('latin-1', 'replace').decode('latin-1') for c in ['Nome', 'Tipo', 'Idade', 'Status', 'Hora']]
-        except: vals = ["-"] * 5
-        pdf.cell(80, 8, vals[0], 1, 0, 'L', fill); pdf.cell(30, 8, vals[1], 1, 0, 'C', fill)
-        pdf.cell(30, 8, vals[2], 1, 0, 'C', fill); pdf.cell(30, 8, vals[3], 1, 0, 'C', fill)
-        pdf.cell(20, 8, vals[4], 1, 1, 'C', fill)
-        fill = not fill
-        
-    try: return bytes(pdf.output())
-    except: return pdf.output(dest='S').encode('latin-1')
+@st.cache_data(max_entries=16, show_spinner=False)
+def generate_pdf(book, party_name, day, version, _store):
+    """Só roda no clique de download; a chave do cache é o salão e a versão do evento, não a lista"""
+    with _store.lock:
+        columns = _store.columns([name for name, _, _ in PDF_COLUMNS])
+        p_counts, guest_limit = _store.counts(), _store.limit
+    data = logo_bytes()
+    logo = io.BytesIO(data) if data else None
+    return build_report_pdf(party_name, columns, p_counts, guest_limit, get_brazil_time().strftime('%d/%m/%Y %H:%M'), logo,
+                            free_age=get_parser().free_age)
 
 # ==========================================
 # 5. LÓGICA DE APLICAÇÃO
 # ==========================================
 
-download_logo()
-if HAS_GSHEETS: check_and_init_headers()
-
-defaults = {'active': False, 'name': '', 'limit': 100, 'guests': [], 'last_time': None}
+get_logo()
+if METRICAS_JSONL: METRICS.record_to(METRICAS_JSONL)
+defaults = {'active': False, 'name': '', 'day': '', 'my_ids': [], 'seen_version': -1, 'pending_dups': [], 'auto_refresh': True,
+            'venue': next(iter(get_venues()))}
 for k, v in defaults.items():
     if k not in st.session_state: st.session_state[k] = v
 
+if HAS_GSHEETS:
+    check_and_init_headers()
+    for sheet_name in get_venues().values():
+        start_archiver(sheet_name)
+        if HISTORICO_DIR: start_history_exporter(sheet_name)
+
 def sync_data():
-    if st.session_state.active and HAS_GSHEETS:
+    if st.session_state.active:
         with st.spinner("Sincronizando..."):
-            guests, limit = load_data_from_sheets(st.session_state.name)
-            st.session_state.guests = guests
-            st.session_state.limit = limit
+            guests, limit = load_data_from_sheets(st.session_state.name, party_day())
+            current_store().load(guests, limit)
 
-def handle_add_guest_smart():
-    raw_text = st.session_state.smart_input
-    if not raw_text: return
-    
-    parsed = parse_input_text(raw_text)
-    if not parsed: return
-
-    # Anti-duplicação (3s é suficiente para evitar duplo clique)
-    if st.session_state.guests and st.session_state.last_time:
-        last = st.session_state.guests[0]
-        if last['Nome'] == parsed['Nome'] and (datetime.now() - st.session_state.last_time).total_seconds() < 3:
-            st.toast(f"⚠️ {parsed['Nome']} duplicado evitado!")
-            st.session_state.smart_input = ""
-            return
-
-    new_guest = {
-        "id": datetime.now().strftime("%Y%m%d%H%M%S%f"),
+def make_guest(parsed, gid):
+    now = get_brazil_time()
+    return {
+        "id": gid,
         "Nome": parsed['Nome'], "Tipo": parsed['Tipo'], 
         "Idade": parsed['Idade'], "Status": parsed['Status'],
-        "Hora": get_brazil_time().strftime("%H:%M"), "Data": get_brazil_time().strftime("%d/%m/%Y"),
+        "Hora": now.strftime("%H:%M"), "Data": now.strftime("%d/%m/%Y"),
         "Evento": st.session_state.name, "_is_paying": parsed['_is_paying']
     }
+
+def handle_add_guest_smart():
+    raw_text = st.session_state.smart_input
+    if not raw_text: return
     
-    # 1. ATUALIZA A TELA IMEDIATAMENTE (MUITO RÁPIDO)
-    st.session_state.guests.insert(0, new_guest)
-    st.session_state.last_time = datetime.now()
+    batch = get_parser().parse_batch(raw_text)
+    if not batch: return
+
+    store = current_store()
     st.session_state.smart_input = "" 
-    st.toast(f"✅ {parsed['Nome']} ({parsed['Tipo']})")
+
+    base_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    if len(batch) == 1: new_guests = [make_guest(batch[0], base_id)]
+    else: new_guests = [make_guest(p, f"{base_id}{i:03d}") for i, p in enumerate(batch)]
+
+    # Anti-duplicação: mesmo nome + idade já registrado neste evento (em qualquer tablet) ou repetido no que foi colado
+    seen, dups = set(), []
+    for g in new_guests:
+        key = dup_key(g)
+        if store.duplicate_of(g) or (key is not None and key in seen): dups.append(g)
+        seen.add(key)
+    if dups:
+        st.session_state.pending_dups = dups
+        new_guests = [g for g in new_guests if g not in dups]
+        if not new_guests: return
+
+    add_guests(store, new_guests)
+
+def add_guests(store, new_guests):
+    # 1. ATUALIZA A TELA (E OS OUTROS TABLETS) IMEDIATAMENTE
+    store.add_many(new_guests)
+    st.session_state.my_ids.extend(g['id'] for g in new_guests)
+    if len(new_guests) == 1: st.toast(f"✅ {new_guests[0]['Nome']} ({new_guests[0]['Tipo']})")
+    else: st.toast(f"✅ {len(new_guests)} convidados: {', '.join(g['Nome'] for g in new_guests)}")
     
-    # 2. MANDA PARA A NUVEM EM SEGUNDO PLANO (SEM TRAVAR)
-    if HAS_GSHEETS: 
-        save_row(new_guest) # Agora roda em thread
+    # 2. GRAVA NO DIÁRIO LOCAL E MANDA PARA A NUVEM EM SEGUNDO PLANO (SEM TRAVAR)
+    save_rows(new_guests)
+
+def read_guest_list(uploaded):
+    """Lê o CSV/XLSX da lista contratada"""
+    import pandas as pd # Só quem sobe a lista paga o import
+    if uploaded.name.lower().endswith(('.xlsx', '.xls')): return pd.read_excel(uploaded)
+    try: return pd.read_csv(uploaded, sep=None, engine='python')
+    except UnicodeDecodeError:
+        uploaded.seek(0)
+        return pd.read_csv(uploaded, sep=None, engine='python', encoding='latin-1')
+
+def handle_confirm_reentry():
+    """Recepção confirmou que é re-entrada (ou outra pessoa com o mesmo nome)"""
+    add_guests(current_store(), st.session_state.pending_dups)
+    st.session_state.pending_dups = []
+
+def handle_cancel_reentry():
+    st.session_state.pending_dups = []
+
+def handle_pick_from_list(entry):
+    """Confirma a sugestão pelo mesmo caminho da digitação (inclusive anti-duplicação)"""
+    st.session_state.smart_input = guest_list_text(entry)
+    st.session_state.list_query = ""
+    handle_add_guest_smart()
 
 # ==========================================
 # 6. INTERFACE
 # ==========================================
 
 with st.sidebar:
+    if len(get_venues()) > 1:
+        st.selectbox("🏛️ Salão", list(get_venues()), key="venue", disabled=st.session_state.active,
+                     help="Cada salão tem sua planilha; para trocar, saia da festa")
     status_color = "🟢" if get_cached_sheet_object() else "🔴"
-    st.caption(f"{status_color} Conexão: {'Online' if '🟢' in status_color else 'Offline'}")
+    queue = get_write_queue(current_book())
+    st.caption(f"{status_color} Conexão: {'Online' if '🟢' in status_color else 'Offline'} · ⏳ {queue.pending} pendentes · ❌ {queue.failed} falhas")
+    if queue.failed and st.button("🔁 Reenviar falhas"): queue.requeue_failed()
 
     if not st.session_state.active:
         st.header("🎉 Iniciar / Entrar")
@@ -337,11 +546,14 @@ with st.sidebar:
         active = get_active_parties_today()
         
         if active:
-            sel = st.selectbox("Festas encontradas:", active)
+            today = get_brazil_time().strftime("%d/%m/%Y")
+            sel = st.selectbox("Festas encontradas:", active, format_func=lambda p: p[0] if p[1] == today else f"{p[0]} (desde {p[1][:5]})")
             if st.button("👉 Entrar na Festa"):
-                st.session_state.name = sel
+                # O dia é o da abertura da festa: entrar de novo depois da meia-noite cai no mesmo estado
+                st.session_state.name, st.session_state.day = sel
                 st.session_state.active = True
-                sync_data()
+                # Se outro tablet já abriu a festa, o estado compartilhado já está pronto
+                if not current_store().loaded: sync_data()
                 st.rerun()
         else:
             st.info("Nenhuma festa encontrada.")
@@ -352,8 +564,8 @@ with st.sidebar:
         
         if st.button("🚀 Criar Nova"):
             if not new_name: st.error("Nome obrigatório!")
-            elif not get_cached_sheet_object(): st.error("Sem conexão!")
             else:
+                if not get_cached_sheet_object(): st.toast("📴 Sem conexão: a festa será enviada quando a rede voltar")
                 marker = {
                     "id": "SYSTEM", "Nome": "--- START ---", "Tipo": "System",
                     "Idade": str(new_limit), "Status": "SYSTEM_START",
@@ -362,76 +574,134 @@ with st.sidebar:
                 }
                 save_row(marker)
                 st.session_state.name = new_name
-                st.session_state.limit = new_limit
+                st.session_state.day = marker['Data']
                 st.session_state.active = True
-                st.session_state.guests = []
+                store = current_store()
+                if store.loaded: store.set_limit(new_limit)
+                else: store.load([], new_limit)
                 st.rerun()
     else:
         st.header(f"🎈 {st.session_state.name}")
         st.markdown("### 📂 Relatórios")
-        df = pd.DataFrame(st.session_state.guests)
-        
-        c_counts = {'total': 0, 'paying': 0, 'free': 0, 'cortesia': 0, 'children_total': 0}
-        if not df.empty:
-            c_counts['total'] = len(df)
-            c_counts['paying'] = df[df['_is_paying'] == True].shape[0]
-            c_counts['cortesia'] = df[df['Tipo'] == 'Cortesia'].shape[0]
-            c_counts['free'] = df[df['_is_paying'] == False].shape[0] - c_counts['cortesia']
-            c_counts['children_total'] = df[df['Tipo'] == 'Criança'].shape[0]
-            
-            cols_drop = ['_is_paying', 'id']
-            pdf_data = generate_pdf(st.session_state.name, df.drop(columns=[c for c in cols_drop if c in df.columns], errors='ignore'), c_counts, st.session_state.limit)
-            
-            st.download_button("📄 Baixar PDF", pdf_data, "Relatorio.pdf", "application/pdf", use_container_width=True)
-            msg = f"Relatório {st.session_state.name}: {c_counts['paying']} Pagantes. Total: {c_counts['total']}/{st.session_state.limit}"
+        store = current_store()
+        c_counts = store.counts() # Contadores mantidos pelo estado, sem DataFrame
+        if c_counts['total']:
+            book, party_name, version = current_book(), st.session_state.name, store.version
+            st.download_button("📄 Baixar PDF", lambda: generate_pdf(book, party_name, store.day, version, store), "Relatorio.pdf", "application/pdf", use_container_width=True)
+            msg = f"Relatório {st.session_state.name}: {c_counts['paying']} Pagantes. Total: {c_counts['total']}/{store.limit}"
             st.link_button("📱 Enviar Zap", f"https://api.whatsapp.com/send?text={msg}", use_container_width=True)
         else: st.info("Sem dados.")
 
         st.divider()
+        st.toggle("⚡ Atualização automática", key="auto_refresh", help="Traz sozinho o que os outros tablets registram")
         if st.button("🔄 Sincronizar"): sync_data()
+
+        with st.expander("📋 Lista de Convidados"):
+            if store.guest_list: st.caption(f"{len(store.guest_list)} nomes importados")
+            uploaded = st.file_uploader("CSV ou Excel (coluna Nome, opcional Idade)", type=["csv", "xlsx"])
+            if uploaded and st.button("📥 Importar Lista"):
+                try:
+                    store.guest_list = GuestListIndex(guest_list_entries(read_guest_list(uploaded)))
+                    st.success(f"{len(store.guest_list)} nomes importados!")
+                except Exception as e: st.error(f"Não consegui ler o arquivo: {e}")
         
         with st.expander("🗑️ Excluir (Senha)"):
-            if st.session_state.guests:
-                opts = {f"{g['Nome']} ({g['Hora']})": g['id'] for g in st.session_state.guests}
-                sel_del = st.selectbox("Selecione:", list(opts.keys()))
+            if c_counts['total']:
+                opts = {f"{g['Nome']} ({g['Hora']})": g for g in store.guests()}
+                sel_del = st.multiselect("Selecione:", list(opts.keys()))
                 pwd = st.text_input("Senha", type="password")
-                if st.button("Confirmar Exclusão"):
+                if st.button("Confirmar Exclusão") and sel_del:
                     if pwd == SENHA_ADMIN:
-                        delete_row(opts[sel_del])
-                        st.session_state.guests = [g for g in st.session_state.guests if g['id'] != opts[sel_del]]
+                        # Exclusões seguidas saem num único batch_update
+                        for k in sel_del:
+                            delete_row(opts[k])
+                            store.remove(opts[k]['id'])
                         st.success("Deletado!")
                         st.rerun()
                     else: st.error("Senha errada")
         
+        with st.expander("🧹 Duplicados (Senha)"):
+            dup_pwd = st.text_input("Senha", type="password", key="dup_pass")
+            if dup_pwd == SENHA_ADMIN:
+                groups = find_duplicate_groups(store.guests())
+                if not groups: st.info("Nenhum duplicado.")
+                # Nome comum repete de verdade: só sai o que a recepção marcar, grupo a grupo
+                picked = [gs for gs in groups
+                          if st.checkbox(f"**{gs[0]['Nome']}** ({gs[0]['Idade']}): " + ", ".join(g['Hora'] for g in gs), key=f"dup_{gs[0]['id']}")]
+                if picked and st.button(f"Manter só o primeiro dos {len(picked)} marcados"):
+                    # Todas as exclusões saem juntas num único batch_update
+                    for gs in picked:
+                        for g in gs[1:]:
+                            delete_row(g)
+                            store.remove(g['id'])
+                    st.rerun()
+            elif dup_pwd: st.error("Senha errada")
+
         st.divider()
         if st.button("🔴 Sair / Encerrar"):
-            for k in ['active', 'name', 'guests']: st.session_state[k] = defaults[k]
+            for k in ['active', 'name', 'day', 'my_ids', 'pending_dups']: st.session_state[k] = defaults[k]
             st.rerun()
 
+    with st.expander("🩺 Diagnóstico (Senha)"):
+        diag_pwd = st.text_input("Senha", type="password", key="diag_pass")
+        if diag_pwd == SENHA_ADMIN:
+            snap = METRICS.snapshot()
+            st.caption(" · ".join(f"{k}: {v}" for k, v in snap['gauges'].items()) or "Fila ainda não iniciada")
+            if snap['ops']:
+                st.dataframe([{'Operação': op, **m} for op, m in snap['ops'].items()], use_container_width=True, hide_index=True)
+            else: st.info("Nada medido ainda.")
+            if snap['counters']: st.caption(" · ".join(f"{k}: {v}" for k, v in snap['counters'].items()))
+            st.download_button("⬇️ Prometheus", METRICS.prometheus_text(), "buffet_metrics.prom", "text/plain", use_container_width=True)
+            st.download_button("⬇️ JSONL", METRICS.jsonl_line() + "\n", "buffet_metrics.jsonl", "application/x-ndjson", use_container_width=True)
+        elif diag_pwd: st.error("Senha errada")
+
+    if HISTORICO_DIR:
+        with st.expander("📈 Histórico (Senha)"):
+            hist_pwd = st.text_input("Senha", type="password", key="hist_pass")
+            if hist_pwd == SENHA_ADMIN:
+                hist_dir = venue_path(HISTORICO_DIR, current_book())
+                exporter = start_history_exporter(current_book())['exporter'] if HAS_GSHEETS else None
+                if exporter and st.button("🔄 Exportar agora"):
+                    with st.spinner("Compactando a planilha..."):
+                        try: st.toast(f"{exporter.run_once()} linhas novas no histórico")
+                        except Exception as e: st.error(f"Falhou: {e}")
+                state_path = os.path.join(hist_dir, "_estado.json")
+                if not os.path.exists(state_path): st.info("Histórico ainda não exportado.")
+                else:
+                    events, weekdays = history_summary(hist_dir, os.path.getmtime(state_path))
+                    over = int(events['passou_limite'].sum())
+                    st.caption(f"{len(events)} eventos · {over} passaram do limite de pagantes")
+                    st.dataframe(weekdays, use_container_width=True, hide_index=True)
+                    st.dataframe(events[['data', 'evento', 'pagantes', 'isentos', 'cortesias', 'criancas', 'limite', 'passou_limite']],
+                                 use_container_width=True, hide_index=True)
+            elif hist_pwd: st.error("Senha errada")
+
 c1, c2, c3 = st.columns([1, 2, 1])
 with c2:
-    if os.path.exists(LOGO_PATH): st.image(LOGO_PATH, use_container_width=True)
+    if logo_bytes(): st.image(logo_bytes(), use_container_width=True)
+
+@st.fragment(run_every="2s")
+def watch_event_store():
+    """Só este pedaço roda a cada 2s; a tela inteira redesenha apenas se o evento mudou"""
+    if st.session_state.auto_refresh: pull_sheet_changes()
+    if current_store().version != st.session_state.seen_version: st.rerun()
 
 if st.session_state.active:
-    df = pd.DataFrame(st.session_state.guests)
-    counts = {'total': 0, 'paying': 0, 'free': 0, 'cortesia': 0, 'children_total': 0}
-    if not df.empty:
-        counts['total'] = len(df)
-        counts['paying'] = df[df['_is_paying'] == True].shape[0]
-        counts['cortesia'] = df[df['Tipo'] == 'Cortesia'].shape[0]
-        counts['free'] = df[df['_is_paying'] == False].shape[0] - counts['cortesia']
-        counts['children_total'] = df[df['Tipo'] == 'Criança'].shape[0]
+    store = current_store()
+    st.session_state.seen_version = store.version
+    watch_event_store()
+    counts = store.counts()
 
     st.markdown(f"<h2 style='text-align: center;'>{st.session_state.name}</h2>", unsafe_allow_html=True)
     
     # CORREÇÃO: Lotação baseada apenas em PAGANTES vs Limite
-    limit_val = st.session_state.limit if st.session_state.limit > 0 else 1
+    limit_val = store.limit if store.limit > 0 else 1
     pct = min(counts['paying'] / limit_val, 1.0)
     
-    st.write(f"**Lotação (Apenas Pagantes):** {counts['paying']} / {st.session_state.limit}")
+    st.write(f"**Lotação (Apenas Pagantes):** {counts['paying']} / {store.limit}")
     st.progress(pct)
     
-    if counts['paying'] >= st.session_state.limit: 
+    if counts['paying'] >= store.limit: 
         st.error("⚠️ LIMITE DE LOTAÇÃO (PAGANTES) ATINGIDO!")
 
     c1, c2, c3 = st.columns(3)
@@ -445,23 +715,41 @@ if st.session_state.active:
     with tab1:
         with st.container(border=True):
             st.subheader("Digite Nome ou Comando")
-            st.caption("Ex: 'Carlos' (Adulto), 'Helena 6' (Criança 6), 'Maria Mãe' (Cortesia)")
+            st.caption("Ex: 'Carlos' (Adulto), 'Helena 6' (Criança 6), 'Maria Mãe' (Cortesia). Família: 'Ana 5, João 9, Maria mãe'")
             
             st.text_input("", placeholder="Digite aqui e aperte Enter...", key="smart_input", on_change=handle_add_guest_smart)
+
+            if st.session_state.pending_dups:
+                for g in st.session_state.pending_dups:
+                    prev = store.duplicate_of(g)
+                    if prev: st.warning(f"⚠️ {g['Nome']} ({g['Idade']}) já foi registrado às {prev['Hora']}. É uma re-entrada?")
+                    else: st.warning(f"⚠️ {g['Nome']} ({g['Idade']}) aparece mais de uma vez no que foi digitado. São pessoas diferentes?")
+                d1, d2 = st.columns(2)
+                d1.button("✅ Confirmar Re-entrada", on_click=handle_confirm_reentry)
+                d2.button("✖️ Cancelar", on_click=handle_cancel_reentry)
+
+            if store.guest_list:
+                query = st.text_input("🔎 Buscar na lista contratada", placeholder="Comece a digitar o nome...", key="list_query")
+                if query:
+                    matches = store.guest_list.search(query, limit=6)
+                    if not matches: st.caption("Ninguém na lista com esse nome.")
+                    for i, entry in enumerate(matches):
+                        st.button(f"➕ {guest_list_text(entry)}", key=f"pick_{i}", on_click=handle_pick_from_list, args=(entry,))
             
             st.write("")
-            if st.session_state.guests:
-                if st.button("↩️ Desfazer Último"):
-                    last = st.session_state.guests.pop(0)
-                    if HAS_GSHEETS: delete_row(last['id'])
+            if counts['total']:
+                # Desfaz o último registro DESTE tablet, não o de outra portaria
+                if st.session_state.my_ids and st.button("↩️ Desfazer Último"):
+                    last = store.remove(st.session_state.my_ids.pop())
+                    if last: delete_row(last)
                     st.rerun()
                 
                 st.markdown("---")
                 st.write("📝 **Últimos 5 Registros:**")
-                recent_df = pd.DataFrame(st.session_state.guests[:5])
-                if not recent_df.empty:
+                recent = [{k: g.get(k, '') for k in ('Nome', 'Tipo', 'Idade', 'Status', 'Hora')} for g in store.recent(5)]
+                if recent:
                     st.dataframe(
-                        recent_df[['Nome', 'Tipo', 'Idade', 'Status', 'Hora']], 
+                        recent, 
                         use_container_width=True, 
                         hide_index=True
                     )
@@ -481,20 +769,30 @@ if st.session_state.active:
     with st.expander("📊 Gráficos (Admin)"):
         pwd = st.text_input("Senha Admin", type="password", key="report_pass")
         if pwd == SENHA_ADMIN:
-            if not df.empty:
-                if 'Hora' in df.columns:
-                    try:
-                        df['dt'] = pd.to_datetime(df['Hora'], format='%H:%M').apply(lambda x: x.replace(year=2024))
-                        df['15min'] = df['dt'].dt.floor('15T')
-                        counts_time = df['15min'].value_counts().sort_index().reset_index()
-                        counts_time.columns = ['Horário', 'Chegadas']
-                        counts_time['Horário'] = counts_time['Horário'].dt.strftime('%H:%M')
-                        st.plotly_chart(px.bar(counts_time, x='Horário', y='Chegadas', text='Chegadas'), use_container_width=True)
-                    except: pass
-                
+            # Gráfico direto do histograma mantido pelo estado: custa o número de faixas, não de convidados
+            labels, series = store.arrival_window()
+            if labels:
+                import plotly.graph_objects as go
+                fig = go.Figure([
+                    go.Bar(x=labels, y=series['paying'], name="Pagantes"),
+                    go.Bar(x=labels, y=series['free'], name="Isentos"),
+                    go.Bar(x=labels, y=series['cortesia'], name="Cortesias"),
+                    go.Scatter(x=labels, y=series['children'], name="Crianças", mode="lines+markers"),
+                ])
+                fig.update_layout(barmode='stack', xaxis_title="Horário (15 min)", yaxis_title="Chegadas", legend_orientation='h')
+                st.plotly_chart(fig, use_container_width=True)
+
+            # Só aqui a lista vira tabela (conferência)
+            guests = store.guests()
+            if guests:
+                import pandas as pd
+                df = pd.DataFrame(guests)
                 st.dataframe(df.drop(columns=['_is_paying', 'id'], errors='ignore'), use_container_width=True, hide_index=True)
             else: st.info("Sem dados.")
         elif pwd: st.error("Senha errada")
 
 else:
-    st.info("👈 Comece pela barra lateral.")
\ No newline at end of file
+    st.info("👈 Comece pela barra lateral.")
+
+# Só conta reruns que chegam ao fim (st.rerun/st.stop interrompem antes)
+METRICS.observe('app.rerun', time.perf_counter() - RERUN_START)
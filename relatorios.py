@@ -0,0 +1,204 @@
+"""Relatórios de fechamento: todos os eventos de um dia de uma vez, sem abrir a tela.
+
+Lê a página do dia uma única vez, agrupa as linhas por Evento/Data e monta os
+PDFs (o mesmo layout e os mesmos contadores do app) em paralelo num pool de
+processos. Grava um ZIP com um PDF por evento e, ao lado, um CSV de resumo
+com os contadores e a mensagem do Zap de cada festa.
+
+    python relatorios.py
+    python relatorios.py --data 17/10/2026 --planilha "Buffet Praia" --saida fechamento.zip
+
+Quem chegou depois da meia-noite conta na festa aberta no dia, como no app, e
+de madrugada o padrão ainda é o dia da festa de ontem.
+
+As credenciais vêm do mesmo .streamlit/secrets.toml do app.
+"""
+import argparse
+import csv
+import io
+import os
+import time
+import tomllib
+import unicodedata
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from buffet_core import HEADERS, METRICS, PDF_COLUMNS, EventStore, WorksheetNotFound, build_report_pdf, next_day, partition_title, party_date
+
+SHEET_NAME = "Controle_Buffet"
+PARTICAO = None # Mesmo PARTICAO do app ("dia", "mes" ou None = sheet1)
+FREE_AGE = 7 # Mesmo IDADE_ISENTO do app (só muda o rótulo do PDF; o Status vem da planilha)
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+LOGO_PATH = "logo_cache.png"
+SCOPE = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+SUMMARY_FIELDS = ["data", "evento", "pagantes", "isentos", "cortesias", "criancas", "total", "limite", "passou_limite", "mensagem", "arquivo"]
+
+# ==========================================
+# LEITURA (UMA VEZ POR DIA)
+# ==========================================
+
+def open_client(secrets_path=SECRETS_PATH):
+    """Cliente gspread com a conta de serviço do secrets.toml do app"""
+    import gspread
+    from google.oauth2.service_account import Credentials
+    with open(secrets_path, "rb") as f: secrets = tomllib.load(f)
+    info = secrets.get("gcp_service_account") or secrets.get("gsheets")
+    if not info: raise SystemExit(f"{secrets_path} sem [gcp_service_account] nem [gsheets]")
+    with METRICS.timed('sheets.authorize'):
+        return gspread.authorize(Credentials.from_service_account_info(dict(info), scopes=SCOPE))
+
+def read_day(client, book_name, day, mode=PARTICAO):
+    """Todas as linhas das páginas do dia e do seguinte (get_all_values); partição que não existe não é criada"""
+    with METRICS.timed('sheets.open'): book = client.open(book_name)
+    values, titles = [], []
+    for d in (day, next_day(day)):
+        title = partition_title(d, mode)
+        if title in titles: continue
+        titles.append(title)
+        try:
+            with METRICS.timed('sheets.worksheet', expected=WorksheetNotFound):
+                sheet = book.sheet1 if title is None else book.worksheet(title)
+        except WorksheetNotFound: continue
+        with METRICS.timed('sheets.get_all_values'): page = sheet.get_all_values()
+        values += page[1:] if values else page
+    return values
+
+def _limit(value, default):
+    try: return int(value)
+    except (TypeError, ValueError): return default
+
+def group_events(values, day):
+    """Linhas da planilha -> eventos do dia (ordem de abertura), cada um com limite e convidados.
+
+    Como no app (party_days), as linhas do dia seguinte de uma festa aberta no
+    dia são de quem chegou depois da meia-noite e contam nela.
+    """
+    if not values: return []
+    header, rows = (values[0], values[1:]) if values[0][:1] == HEADERS[:1] else (HEADERS, values)
+    col = {name: i for i, name in enumerate(header)}
+    after, found = next_day(day), []
+    for row in rows:
+        rec = {name: (row[i] if i < len(row) else '') for name, i in col.items()}
+        data, name = str(rec.get('Data', '')).strip(), str(rec.get('Evento', '')).strip()
+        if name and data in (day, after): found.append((data, name, rec))
+    opened = {name.lower() for data, name, _ in found if data == day}
+    events = {}
+    for data, name, rec in found:
+        if name.lower() not in opened: continue
+        ev = events.setdefault(name.lower(), {'evento': name, 'data': day, 'limite': 100, 'convidados': []})
+        if rec.get('Status') == "SYSTEM_START":
+            # Como no app: vale o último marcador, e o nome escrito na criação da festa
+            ev['limite'], ev['evento'] = _limit(rec.get('Idade'), ev['limite']), name
+            continue
+        rec['id'] = str(rec.get('id') or '')
+        rec['_is_paying'] = rec.get('Status') == 'Pagante'
+        ev['convidados'].append(rec)
+    return list(events.values())
+
+# ==========================================
+# PDFs (POOL DE PROCESSOS)
+# ==========================================
+
+def render_event(event, generated_at, logo=None, free_age=FREE_AGE):
+    """Um evento -> (pdf, contadores); roda num processo do pool (tudo aqui é picklável)"""
+    store = EventStore(event['evento'], event['data'])
+    store.load(event['convidados'][::-1], event['limite'])
+    columns = store.columns([name for name, _, _ in PDF_COLUMNS])
+    counts = store.counts()
+    pdf = build_report_pdf(event['evento'], columns, counts, store.limit, generated_at, io.BytesIO(logo) if logo else None, free_age)
+    return pdf, counts
+
+def pdf_name(event, used):
+    """Nome de arquivo sem acento nem barra, único dentro do ZIP"""
+    plain = unicodedata.normalize('NFKD', event['evento']).encode('ascii', 'ignore').decode()
+    base = "".join(c if c.isalnum() else "_" for c in plain).strip("_") or "evento"
+    name, n = f"{base}.pdf", 1
+    while name in used:
+        n += 1
+        name = f"{base}_{n}.pdf"
+    used.add(name)
+    return name
+
+def summary_row(event, counts, filename):
+    limit = event['limite']
+    return {
+        'data': event['data'], 'evento': event['evento'], 'pagantes': counts['paying'], 'isentos': counts['free'],
+        'cortesias': counts['cortesia'], 'criancas': counts['children_total'], 'total': counts['total'], 'limite': limit,
+        'passou_limite': counts['paying'] > limit,
+        'mensagem': f"Relatório {event['evento']}: {counts['paying']} Pagantes. Total: {counts['total']}/{limit}",
+        'arquivo': filename,
+    }
+
+def build_reports(events, generated_at, logo=None, workers=None, free_age=FREE_AGE):
+    """[(evento, pdf, contadores)] na ordem dos eventos; um evento só nem abre o pool"""
+    if len(events) < 2 or workers == 1:
+        return [(ev, *render_event(ev, generated_at, logo, free_age)) for ev in events]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_event, ev, generated_at, logo, free_age) for ev in events]
+        return [(ev, *f.result()) for ev, f in zip(events, futures)]
+
+def write_bundle(zip_path, reports):
+    """Grava o ZIP com os PDFs e o CSV de resumo ao lado (mesmo nome, .csv); devolve o caminho do CSV"""
+    used, rows = set(), []
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for event, pdf, counts in reports:
+            name = pdf_name(event, used)
+            zf.writestr(name, pdf)
+            rows.append(summary_row(event, counts, name))
+    csv_path = os.path.splitext(zip_path)[0] + ".csv"
+    # utf-8-sig: o Excel abre com acento certo
+    with open(csv_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return csv_path
+
+# ==========================================
+# LINHA DE COMANDO
+# ==========================================
+
+def today():
+    import pytz
+    return datetime.now(pytz.timezone('America/Sao_Paulo'))
+
+def main(argv=None, client=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--data", help="dia dos eventos (DD/MM/AAAA); padrão: hoje (de madrugada, ontem)")
+    ap.add_argument("--planilha", default=SHEET_NAME, help="planilha do salão")
+    ap.add_argument("--particao", default=PARTICAO or "nenhuma", choices=["dia", "mes", "nenhuma"], help="como o app particiona a planilha")
+    ap.add_argument("--saida", help="ZIP de saída; padrão: relatorios_AAAA-MM-DD.zip")
+    ap.add_argument("--processos", type=int, default=None, help="processos do pool (padrão: um por CPU)")
+    ap.add_argument("--secrets", default=SECRETS_PATH, help="secrets.toml com a conta de serviço")
+    ap.add_argument("--logo", default=LOGO_PATH, help="logo do cabeçalho (o app guarda em logo_cache.png)")
+    ap.add_argument("--idade-isento", type=int, default=FREE_AGE, help="IDADE_ISENTO do app (rótulo 'Isentos' do PDF)")
+    args = ap.parse_args(argv)
+
+    now = today()
+    day = args.data or party_date(now)
+    try: stamp = datetime.strptime(day, "%d/%m/%Y").strftime("%Y-%m-%d")
+    except ValueError: ap.error(f"data inválida: {day} (use DD/MM/AAAA)")
+    zip_path = args.saida or f"relatorios_{stamp}.zip"
+    logo = None
+    if args.logo and os.path.exists(args.logo):
+        with open(args.logo, "rb") as f: logo = f.read()
+
+    started = time.perf_counter()
+    values = read_day(client or open_client(args.secrets), args.planilha, day, None if args.particao == "nenhuma" else args.particao)
+    events = group_events(values, day)
+    read_s = time.perf_counter() - started
+    if not events:
+        print(f"Nenhum evento em {day} na planilha {args.planilha}.")
+        return 1
+
+    reports = build_reports(events, now.strftime('%d/%m/%Y %H:%M'), logo, args.processos, args.idade_isento)
+    csv_path = write_bundle(zip_path, reports)
+    total_s = time.perf_counter() - started
+    for event, _, counts in reports:
+        print(f"{event['evento']:<30} {counts['paying']:>4} pagantes {counts['total']:>5} total / {event['limite']}")
+    print(f"{len(reports)} relatórios em {zip_path} (resumo: {csv_path}) · "
+          f"{len(values)} linhas lidas em {read_s:.2f}s · total {total_s:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,37 @@
+import pathlib
+from datetime import datetime, timedelta
+
+import pytz
+
+from buffet_core import EventStore, party_date
+
+APP = pathlib.Path(__file__).parents[1] / "lista_convidado.py"
+
+def guest(gid, hora, data, tipo='Adulto'):
+    return {'id': gid, 'Nome': f"G{gid}", 'Idade': '-', 'Tipo': tipo, 'Status': 'Pagante', 'Hora': hora, 'Data': data,
+            '_is_paying': True}
+
+def test_after_midnight_lands_after_2345_in_the_same_chart():
+    store = EventStore("festa", "17/10/2026")
+    store.add_many([guest("1", "23:50", "17/10/2026"), guest("2", "00:30", "18/10/2026")])
+    labels, series = store.arrival_window()
+    assert labels[0] == "23:45" and labels[-1] == "00:30 (+1)"
+    assert sum(series['total']) == 2 and store.arrivals.outside == 0
+
+def test_party_day_is_still_yesterday_before_dawn():
+    assert party_date(datetime(2026, 10, 18, 1, 30)) == "17/10/2026"
+    assert party_date(datetime(2026, 10, 18, 9, 0)) == "18/10/2026"
+
+def test_app_keeps_the_party_store_after_midnight(tmp_path, monkeypatch):
+    """Tablet que entrou na festa ontem: o check-in de hoje (Data nova) cai no mesmo estado e no mesmo gráfico"""
+    from streamlit.testing.v1 import AppTest
+    monkeypatch.chdir(tmp_path)  # diário e logo do app ficam no diretório temporário (sem secrets = offline)
+    yesterday = (datetime.now(pytz.timezone('America/Sao_Paulo')) - timedelta(days=1)).strftime("%d/%m/%Y")
+    at = AppTest.from_file(str(APP), default_timeout=30)
+    at.session_state['name'], at.session_state['day'], at.session_state['active'] = "Festa", yesterday, True
+    at.run()
+    at.text_input(key="smart_input").input("Carlos").run()
+    at.text_input(key="report_pass").input("1234").run()
+    assert not at.exception
+    chart = at.get("plotly_chart")[0].proto.spec
+    assert "(+1)" in chart
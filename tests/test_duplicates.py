@@ -0,0 +1,22 @@
+from buffet_core import EventStore, find_duplicate_groups
+
+def guest(gid, nome, idade="-"):
+    return {'id': gid, 'Nome': nome, 'Idade': idade, 'Tipo': 'Adulto', 'Status': 'Pagante', 'Hora': '19:00',
+            'Data': '17/10/2026', '_is_paying': True}
+
+def test_same_name_and_age_is_a_duplicate():
+    store = EventStore("festa", "17/10/2026")
+    store.add(guest("1", "Ana Clara", "5 anos"))
+    assert store.duplicate_of({'Nome': "ana  clara", 'Idade': "5"})['id'] == "1"
+    assert store.duplicate_of({'Nome': "Ana Clara", 'Idade': "6 anos"}) is None
+
+def test_age_only_entries_are_never_duplicates():
+    store = EventStore("festa", "17/10/2026")
+    store.add_many([guest("1", "Criança", "5 anos"), guest("2", "Criança", "5 anos")])
+    assert store.duplicate_of({'Nome': "Criança", 'Idade': "5 anos"}) is None
+    assert find_duplicate_groups(store.guests()) == []
+
+def test_groups_oldest_first():
+    groups = find_duplicate_groups([guest("20261017200000000002", "Caio"), guest("20261017190000000001", "caio"),
+                                    guest("3", "Bia")])
+    assert [[g['id'] for g in gs] for gs in groups] == [["20261017190000000001", "20261017200000000002"]]
@@ -0,0 +1,22 @@
+from buffet_core import HEADERS
+from historico import HistoryStore, event_summary
+
+DAY, NEXT = "17/10/2026", "18/10/2026"
+
+def marker(limit, hora, evento="Festa", day=DAY):
+    return ["", "SYSTEM", "", str(limit), "SYSTEM_START", hora, day, evento]
+
+def row(gid, nome, hora, day=DAY, evento="Festa"):
+    return [gid, nome, "Adulto", "30", "Pagante", hora, day, evento]
+
+def summary(tmp_path, rows):
+    HistoryStore(str(tmp_path)).export_page("Controle_Buffet/Página1", [HEADERS] + rows)
+    return [(r['data'].strftime("%d/%m/%Y"), r['evento_key'], r['total'], r['limite']) for r in event_summary(str(tmp_path)).to_pylist()]
+
+def test_newest_marker_sets_the_limit(tmp_path):
+    assert summary(tmp_path, [marker(80, "18:00"), marker(50, "18:30"), row("1", "Ana", "19:00")]) == [(DAY, "festa", 1, 50)]
+
+def test_after_midnight_arrivals_count_in_the_party(tmp_path):
+    rows = [marker(80, "18:00"), row("1", "Ana", "19:00"), row("2", "Bia", "00:30", NEXT),
+            marker(10, "14:00", "Outra", NEXT), row("3", "Caio", "15:00", NEXT, "Outra")]
+    assert sorted(summary(tmp_path, rows)) == [(DAY, "festa", 2, 80), (NEXT, "outra", 1, 10)]
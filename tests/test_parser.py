@@ -0,0 +1,37 @@
+import pytest
+
+from buffet_core import GuestParser, guest_list_text
+
+@pytest.fixture
+def parser():
+    return GuestParser(free_age=7)
+
+def summary(guests):
+    return [(g['Nome'], g['Idade'], g['Status']) for g in guests]
+
+@pytest.mark.parametrize("text, expected", [
+    ("Carlos", [("Carlos", "-", "Pagante")]),
+    ("Helena 6", [("Helena", "6 anos", "Isento")]),
+    ("Maria Mãe", [("Maria Mãe", "-", "Cortesia")]),
+    # Vírgula dentro de uma pessoa só: parentesco ou idade voltam para o nome anterior
+    ("Maria, mãe", [("Maria Mãe", "-", "Cortesia")]),
+    ("Helena, 6", [("Helena", "6 anos", "Isento")]),
+    ("João, 10 anos", [("João", "10 anos", "Pagante")]),
+    ("Pedro, 3a", [("Pedro", "3 anos", "Isento")]),
+])
+def test_single_guest(parser, text, expected):
+    assert summary(parser.parse_batch(text)) == expected
+
+def test_family_batch(parser):
+    assert summary(parser.parse_batch("Ana 5, João 9, Maria mãe")) == [
+        ("Ana", "5 anos", "Isento"), ("João", "9 anos", "Pagante"), ("Maria Mãe", "-", "Cortesia")]
+
+def test_age_after_someone_with_age_is_another_child(parser):
+    assert summary(parser.parse_batch("Ana 5\n7")) == [("Ana", "5 anos", "Isento"), ("Criança", "7 anos", "Isento")]
+
+def test_free_age_is_configurable():
+    assert GuestParser(free_age=10).parse("Bia 9")['Status'] == "Isento"
+
+def test_guest_list_name_with_comma_is_one_guest(parser):
+    text = guest_list_text({'Nome': "Souza, Ana", 'Idade': "5"})
+    assert summary(parser.parse_batch(text)) == [("Souza Ana", "5 anos", "Isento")]
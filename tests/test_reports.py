@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import relatorios
+from buffet_core import HEADERS
+from fake_sheets import FakeClient
+from relatorios import group_events, render_event
+
+DAY = "17/10/2026"
+
+def row(gid, nome, status="Pagante", idade="30", evento="Festa", day=DAY):
+    return [gid, nome, "Adulto", idade, status, "19:00", day, evento]
+
+def test_groups_by_event_with_marker_limit():
+    values = [HEADERS, row("", "SYSTEM", "SYSTEM_START", "80"), row("a1", "Ana"), row("b2", "Bia")]
+    [event] = group_events(values, DAY)
+    assert [g['id'] for g in event['convidados']] == ["a1", "b2"]
+    assert event['limite'] == 80
+    assert render_event(event, "17/10/2026 23:00")[1]['paying'] == 2
+
+def test_same_id_in_other_event_is_kept():
+    values = [HEADERS, row("a1", "Ana"), row("a1", "Ana", evento="Outra")]
+    assert [len(ev['convidados']) for ev in group_events(values, DAY)] == [1, 1]
+
+def test_after_midnight_guests_count_in_the_party():
+    values = [HEADERS, row("", "SYSTEM", "SYSTEM_START", "80"), row("a1", "Ana"),
+              row("b2", "Bia", day="18/10/2026"), row("c3", "Caio", evento="Outra", day="18/10/2026")]
+    [event] = group_events(values, DAY)
+    assert [g['Nome'] for g in event['convidados']] == ["Ana", "Bia"]
+    assert (event['evento'], event['data'], event['limite']) == ("Festa", DAY, 80)
+
+def test_closing_after_midnight_reports_the_open_party(tmp_path, monkeypatch, capsys):
+    client = FakeClient()
+    client.open("Controle_Buffet").sheet1.rows = [list(HEADERS), row("", "SYSTEM", "SYSTEM_START", "80"), row("a1", "Ana"),
+                                                  row("b2", "Bia", day="18/10/2026")]
+    monkeypatch.setattr(relatorios, "today", lambda: datetime(2026, 10, 18, 1, 30))
+    assert relatorios.main(["--saida", str(tmp_path / "f.zip"), "--logo", "", "--processos", "1"], client=client) == 0
+    assert "2 pagantes     2 total / 80" in capsys.readouterr().out
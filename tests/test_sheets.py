@@ -0,0 +1,137 @@
+import time
+from datetime import date
+
+from buffet_core import HEADERS, LocalJournal, SheetIndex, WriteQueue, archive_old_data, to_sheet_row
+from fake_sheets import FakeAPIError, FakeClient
+
+DAY = "17/10/2026"
+
+def guest(gid, nome):
+    return {'id': gid, 'Nome': nome, 'Tipo': 'Adulto', 'Idade': '-', 'Status': 'Pagante', 'Hora': '19:00',
+            'Data': DAY, 'Evento': "Festa"}
+
+def make_sheet(names):
+    sheet = FakeClient().open("Controle_Buffet").sheet1
+    sheet.rows = [list(HEADERS)] + [[str(v) for v in to_sheet_row(guest(str(i), n))] for i, n in enumerate(names, 1)]
+    return sheet
+
+def names_in(sheet):
+    return [row[1] for row in sheet.rows[1:]]
+
+def wait_drained(queue, timeout=10):
+    deadline = time.monotonic() + timeout
+    while queue.pending and time.monotonic() < deadline: time.sleep(0.005)
+    assert not queue.pending, f"fila não esvaziou (último erro: {queue.last_error})"
+
+def make_queue(sheet, index, flush_ms=0, **kw):
+    return WriteQueue(lambda part: sheet, get_index=lambda part: index, flush_ms=flush_ms, offline_wait=0.01, **kw)
+
+def test_single_delete_then_batched_delete():
+    sheet = make_sheet(["Ana", "Bia", "Caio", "Duda", "Edu", "Fabi"])
+    queue = make_queue(sheet, SheetIndex(), flush_ms=200)
+    queue.put_delete(guest("2", "Bia"))
+    wait_drained(queue)
+    assert names_in(sheet) == ["Ana", "Caio", "Duda", "Edu", "Fabi"]
+    assert sheet.backend.calls['delete_rows'] == 1
+    # Depois de uma exclusão as linhas sobem: o lote tem que apagar as linhas certas
+    queue.put_delete(guest("3", "Caio"))
+    queue.put_delete(guest("5", "Edu"))
+    queue.put_delete(guest("6", "Fabi"))
+    wait_drained(queue)
+    assert names_in(sheet) == ["Ana", "Duda"]
+    assert sheet.backend.calls['batch_update'] == 1
+
+def test_delete_after_external_delete():
+    sheet = make_sheet(["Ana", "Bia", "Caio", "Duda"])
+    index = SheetIndex()
+    queue = make_queue(sheet, index)
+    queue.put_delete(guest("4", "Duda"))
+    wait_drained(queue)
+    del sheet.rows[1] # Outra portaria apagou a Ana direto na planilha
+    queue.put_delete(guest("3", "Caio"))
+    wait_drained(queue)
+    assert names_in(sheet) == ["Bia"]
+    assert index.full_scans == 2
+
+def test_delete_removes_every_row_of_the_id():
+    sheet = make_sheet(["Ana", "Bia", "Caio"])
+    sheet.rows.insert(2, list(sheet.rows[1])) # A mesma Ana gravada duas vezes
+    queue = make_queue(sheet, SheetIndex())
+    queue.put_delete(guest("1", "Ana"))
+    wait_drained(queue)
+    assert names_in(sheet) == ["Bia", "Caio"]
+    queue.put_delete(guest("3", "Caio"))
+    wait_drained(queue)
+    assert names_in(sheet) == ["Bia"]
+
+def test_delete_after_archiving_sheet1():
+    sheet = make_sheet(["Ana", "Bia", "Caio"])
+    sheet.rows[1][6] = sheet.rows[2][6] = "01/08/2026" # Ana e Bia são de uma festa antiga
+    index = SheetIndex()
+    index.refresh(sheet)
+    archive = FakeClient(sheet.backend).open("Controle_Buffet_Arquivo")
+    assert archive_old_data(sheet.spreadsheet, archive, None, date(2026, 9, 1), index) == 2
+    assert index.row_of("3") == 2
+    queue = make_queue(sheet, index)
+    queue.put_delete(guest("3", "Caio"))
+    wait_drained(queue)
+    assert names_in(sheet) == []
+    assert names_in(archive.worksheet("Legado")) == ["Ana", "Bia"]
+
+def test_rows_without_id_are_all_kept(tmp_path):
+    sheet = make_sheet(["Ana"])
+    typed = ["", "Criança", "Criança", "5 anos", "Isento", "19:00", DAY, "Festa"]
+    sheet.rows += [list(typed), list(typed)] # Digitadas direto na planilha, sem id
+    index, journal = SheetIndex(), LocalJournal(str(tmp_path / "journal.db"))
+    for _ in range(2): # Reler não duplica
+        index.refresh(sheet)
+        journal.merge(DAY, "Festa", index.records(DAY, "Festa"), time.time())
+    ids = [r['id'] for r in journal.rows(DAY, "Festa")]
+    assert len(ids) == len(set(ids)) == 3
+    queue = make_queue(sheet, index)
+    queue.put_delete({'id': ids[2], 'Data': DAY})
+    wait_drained(queue)
+    assert names_in(sheet) == ["Ana", "Criança"]
+
+def test_retry_after_a_late_error_does_not_append_twice():
+    sheet = make_sheet(["Ana"])
+    index = SheetIndex()
+    index.refresh(sheet)
+    append_rows = sheet.append_rows
+    def stored_then_timeout(values, **kw):
+        # O Google gravou, mas a resposta não chegou
+        sheet.append_rows = append_rows
+        append_rows(values, **kw)
+        raise FakeAPIError(503, "timeout")
+    sheet.append_rows = stored_then_timeout
+    queue = make_queue(sheet, index)
+    queue.put_many([guest("2", "Bia"), guest("3", "Caio")])
+    wait_drained(queue)
+    assert names_in(sheet) == ["Ana", "Bia", "Caio"]
+    assert queue.sent == 2
+
+def test_failing_error_callback_does_not_kill_the_queue():
+    sheet = make_sheet([])
+    def broken(part, exc): raise RuntimeError("dictionary changed size during iteration")
+    queue = make_queue(sheet, SheetIndex(), on_error=broken)
+    sheet.backend.fail_next(1, 503)
+    queue.put(guest("1", "Ana"))
+    wait_drained(queue)
+    queue.put(guest("2", "Bia"))
+    wait_drained(queue)
+    assert names_in(sheet) == ["Ana", "Bia"]
+
+def test_journal_replays_after_restart(tmp_path):
+    path = str(tmp_path / "journal.db")
+    offline = WriteQueue(lambda part: None, journal=LocalJournal(path), flush_ms=0, offline_wait=0.01)
+    offline.put_many([guest("1", "Ana"), guest("2", "Bia")])
+    time.sleep(0.05)
+    assert offline.pending == 2
+    offline.journal.close()
+
+    sheet = make_sheet([])
+    journal = LocalJournal(path)
+    queue = WriteQueue(lambda part: sheet, journal=journal, flush_ms=0, offline_wait=0.01)
+    wait_drained(queue)
+    assert names_in(sheet) == ["Ana", "Bia"]
+    assert journal.unsynced() == []